@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from emojis import count_emojis
+from index import InvertedIndex
+from message import STOPWORDS
+from timestamps import to_seconds
+from vocabulary import Vocabulary
+
+
+def link_site(url) -> str:
+    '''Return die Website eines Links ohne "www." Präfix'''
+    site = url.netloc
+    prefix = "www."
+    if site.startswith(prefix):
+        site = site[len(prefix):]
+    return site
+
+
+class ChatAggregates:
+    '''Zwischenergebnisse für alle Analyzer Metriken pro Nutzer. update() geht
+       einmal über die Nachrichten und füllt alle Zähler gleichzeitig.
+       Kommen neue Nachrichten ans Ende des Chats, reicht ein update()
+       mit den neuen Nachrichten.'''
+
+    def __init__(self) -> None:
+        self._msg_count = Counter()  # Nachrichten pro Nutzer
+        self._usernames = []  # Nutzernamen in der Reihenfolge ihrer ersten Nachricht
+        self._user_codes = array("I")  # Nummer des Nutzers für jede Nachricht
+        self._timestamps = array("q")  # Sekunden seit EPOCH für jede Nachricht
+        self._mediatypes = []  # Medientypen in der Reihenfolge ihres ersten Auftretens
+        self._media_codes = array("i")  # Nummer des Medientyps für jede Nachricht (-1 = keiner)
+        self._msg_word_counts = array("I")  # Anzahl Worte (inkl. stopwords) jeder Nachricht
+        self._vocabulary = Vocabulary(STOPWORDS)
+        self._tokens = {}  # Nutzer -> ids aller Worte (inkl. stopwords) als Array
+        self._index = InvertedIndex()  # Wort -> Nachrichtennummern
+        self._emojis = defaultdict(Counter)  # Emojis (als Zeichen) pro Nutzer
+        self._media = defaultdict(Counter)  # Medientypen pro Nutzer
+        self._links = defaultdict(Counter)  # Websites pro Nutzer
+        self._sites = Counter()  # Websites im ganzen Chat
+
+    def update(self, messages) -> "ChatAggregates":
+        '''Schreibt die Zwischenergebnisse mit (chronologisch neueren) Nachrichten fort'''
+        bodies = defaultdict(list)
+        msg_id = sum(self._msg_count.values())  # Nummer der nächsten Nachricht
+        user_code = {username: code for code, username in enumerate(self._usernames)}
+        media_code = {mediatype: code for code, mediatype in enumerate(self._mediatypes)}
+        for msg in messages:
+            username = msg.username
+            if username not in user_code:
+                user_code[username] = len(self._usernames)
+                self._usernames.append(username)
+            self._msg_count[username] += 1
+            self._user_codes.append(user_code[username])
+            self._timestamps.append(to_seconds(msg.dateandtime))
+            if msg.words is not None:
+                tokens = self._tokens.setdefault(username, array("I"))
+                tokens.extend(self._vocabulary.encode(msg.words))
+                self._index.add(msg_id, msg.words)
+                self._msg_word_counts.append(len(msg.words))
+            else:
+                self._msg_word_counts.append(0)
+            msg_id += 1
+            if msg.mediatype is not None:
+                self._media[username][msg.mediatype] += 1
+                if msg.mediatype not in media_code:
+                    media_code[msg.mediatype] = len(self._mediatypes)
+                    self._mediatypes.append(msg.mediatype)
+                self._media_codes.append(media_code[msg.mediatype])
+            else:
+                self._media_codes.append(-1)
+            if msg.body is not None:
+                bodies[username].append(msg.body)
+                for url in msg.links:
+                    site = link_site(url)
+                    self._links[username][site] += 1
+                    self._sites[site] += 1
+
+        # Emojis pro Nutzer in einem Durchlauf über alle Texte zählen
+        for username, user_bodies in bodies.items():
+            self._emojis[username].update(count_emojis(user_bodies))
+        return self
+
+    def merge(self, other: "ChatAggregates") -> "ChatAggregates":
+        '''Hängt die Zwischenergebnisse der direkt folgenden Nachrichten an (z.B. eines
+           parallel geparsten Abschnitts). Das Ergebnis ist dasselbe wie bei update()
+           mit allen Nachrichten, nur Nutzer, Medientypen und Wort ids werden umnummeriert.'''
+        msg_offset = len(self._timestamps)
+        user_code = {username: code for code, username in enumerate(self._usernames)}
+        for username in other._usernames:
+            if username not in user_code:
+                user_code[username] = len(self._usernames)
+                self._usernames.append(username)
+        user_map = np.array([user_code[username] for username in other._usernames], dtype=np.uint32)
+
+        media_code = {mediatype: code for code, mediatype in enumerate(self._mediatypes)}
+        for mediatype in other._mediatypes:
+            if mediatype not in media_code:
+                media_code[mediatype] = len(self._mediatypes)
+                self._mediatypes.append(mediatype)
+        # letzter Eintrag -1, damit Nachrichten ohne Medium (-1) auch -1 bleiben
+        media_map = np.array([media_code[mediatype] for mediatype in other._mediatypes] + [-1],
+                             dtype=np.int32)
+
+        # neue Worte bekommen ihre ids in der Reihenfolge ihres ersten Auftretens
+        token_map = np.array([self._vocabulary.add(other._vocabulary.word(token_id))
+                              for token_id in range(len(other._vocabulary))], dtype=np.uint32)
+
+        self._msg_count.update(other._msg_count)
+        self._user_codes.frombytes(user_map[np.frombuffer(other._user_codes, dtype=np.uint32)].tobytes())
+        self._timestamps.extend(other._timestamps)
+        self._media_codes.frombytes(media_map[np.frombuffer(other._media_codes, dtype=np.int32)].tobytes())
+        self._msg_word_counts.extend(other._msg_word_counts)
+        for username, tokens in other._tokens.items():
+            self._tokens.setdefault(username, array("I")).frombytes(
+                token_map[np.frombuffer(tokens, dtype=np.uint32)].tobytes())
+        self._index.merge(other._index, msg_offset)
+        for mine, theirs in ((self._emojis, other._emojis), (self._media, other._media),
+                             (self._links, other._links)):
+            for username, counter in theirs.items():
+                mine[username].update(counter)
+        self._sites.update(other._sites)
+        return self
+
+    @property
+    def msg_count(self) -> Counter:
+        '''Return {Nutzername: Anzahl der Nachrichten}'''
+        return self._msg_count
+
+    @property
+    def usernames(self) -> list:
+        '''Return Nutzernamen, Index = Nutzernummer aus user_codes'''
+        return self._usernames
+
+    @property
+    def user_codes(self) -> np.ndarray:
+        '''Return Nutzernummer jeder Nachricht (in Chatreihenfolge)'''
+        return np.frombuffer(self._user_codes, dtype=np.uint32)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        '''Return Sekunden seit EPOCH jeder Nachricht (in Chatreihenfolge)'''
+        return np.frombuffer(self._timestamps, dtype=np.int64)
+
+    @property
+    def mediatypes(self) -> list:
+        '''Return Medientypen, Index = Nummer aus media_codes'''
+        return self._mediatypes
+
+    @property
+    def media_codes(self) -> np.ndarray:
+        '''Return Nummer des Medientyps jeder Nachricht (-1 = keine Medien)'''
+        return np.frombuffer(self._media_codes, dtype=np.int32)
+
+    @property
+    def msg_word_counts(self) -> np.ndarray:
+        '''Return Anzahl Worte (inkl. stopwords) jeder Nachricht'''
+        return np.frombuffer(self._msg_word_counts, dtype=np.uint32)
+
+    @property
+    def vocabulary(self) -> Vocabulary:
+        return self._vocabulary
+
+    @property
+    def index(self) -> InvertedIndex:
+        '''Return den Suchindex (Wort -> Nummern der Nachrichten)'''
+        return self._index
+
+    @property
+    def tokens(self) -> dict:
+        '''Return {Nutzername: Array mit den ids aller Worte (inkl. stopwords)}'''
+        return self._tokens
+
+    def words(self, username: str, include_stopwords: bool = True, tokens=None) -> list:
+        '''Return alle Worte eines Nutzers in der Reihenfolge des Chats
+           tokens: statt aller Worte nur diese ids (z.B. aus einer query.Selection)'''
+        if tokens is None:
+            tokens = self._tokens.get(username, ())
+        if not include_stopwords:
+            stopword_count = self._vocabulary.stopword_count
+            tokens = [token_id for token_id in tokens if token_id >= stopword_count]
+        return self._vocabulary.decode(tokens)
+
+    def word_total(self, username: str) -> int:
+        '''Return Anzahl aller Worte (inkl. stopwords) eines Nutzers'''
+        return len(self._tokens.get(username, ()))
+
+    def _user_tokens(self, username: str, tokens=None) -> np.ndarray:
+        if tokens is None:
+            tokens = np.frombuffer(self._tokens.get(username, array("I")), dtype=np.uint32)
+        return tokens
+
+    def word_counts(self, username: str, tokens=None) -> np.ndarray:
+        '''Return Häufigkeit jeder Wort id für einen Nutzer (Index = id)
+           tokens: wie bei words'''
+        return np.bincount(self._user_tokens(username, tokens), minlength=len(self._vocabulary))
+
+    def most_common_words(self, username: str, n: int,
+                          include_stopwords: bool = False, tokens=None) -> list:
+        '''Return die n häufigsten Worte eines Nutzers [(Wort, Anzahl), ...]
+           (bei gleicher Anzahl kommt das Wort zuerst, das der Nutzer früher
+           benutzt hat, wie bei Counter.most_common)
+           tokens: wie bei words'''
+        tokens = self._user_tokens(username, tokens)
+        counts = np.bincount(tokens, minlength=len(self._vocabulary))
+        if not include_stopwords:
+            counts[:self._vocabulary.stopword_count] = 0
+
+        candidates = np.flatnonzero(counts)
+        if n < len(candidates):
+            # nur die n größten vorsortieren, statt alle Worte zu sortieren
+            top = np.argpartition(-counts[candidates], n - 1)[:n]
+            threshold = counts[candidates[top]].min()
+            candidates = candidates[counts[candidates] >= threshold]
+        # Position der ersten Verwendung jedes Wortes durch den Nutzer
+        first_seen = np.zeros(len(counts), dtype=np.int64)
+        token_ids, first_positions = np.unique(tokens, return_index=True)
+        first_seen[token_ids] = first_positions
+        order = np.lexsort((first_seen[candidates], -counts[candidates]))[:n]
+        return [(self._vocabulary.word(token_id), int(counts[token_id]))
+                for token_id in candidates[order]]
+
+    @property
+    def emojis(self) -> dict:
+        '''Return {Nutzername: Counter der Emojis (als Zeichen)}'''
+        return self._emojis
+
+    @property
+    def media(self) -> dict:
+        '''Return {Nutzername: Counter der Medientypen}'''
+        return self._media
+
+    @property
+    def links(self) -> dict:
+        '''Return {Nutzername: Counter der Websites}'''
+        return self._links
+
+    @property
+    def sites(self) -> Counter:
+        '''Return Counter der Websites im ganzen Chat'''
+        return self._sites
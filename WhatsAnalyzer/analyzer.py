@@ -1,20 +1,138 @@
 # -*- coding: utf-8 -*-
 
-from collections import Counter
+from collections import Counter, OrderedDict, defaultdict
 from collections.abc import Iterable
-import emoji
+from datetime import timedelta
+import sys
+import threading
 
+import numpy as np
+
+from aggregates import link_site
 from chatmanager import ChatManager
+from emojis import count_emojis, emoji_name, extract_emojis
+from heavyhitters import SpaceSaving
+from message import tokenize
+from profiling import profiled
+from query import MessageIndex, Selection, as_seconds
+from replies import replies
+from sessions import SECONDS_PER_DAY, sessions
+from timeline import bucket_counts, bucket_ids
+from timestamps import EPOCH, to_seconds
+from user import User
+
+# Grenzen für Zwischenergebnisse mit frei wählbaren Parametern (Filter, Suchanfragen,
+# gap...), darüber werden die am längsten nicht benutzten verworfen (siehe _memoize)
+MEMO_MAX_ENTRIES = 256
+MEMO_MAX_BYTES = 64 * 1024 ** 2
+
+
+def _estimate_size(value) -> int:
+    '''Return grob geschätzten Speicher eines Zwischenergebnisses in Bytes
+       (Container mit Inhalt, geteilte Objekte werden mehrfach gezählt)'''
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.flags.owndata else value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(key) + _estimate_size(item)
+                                          for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + _estimate_size(vars(value))
+    return sys.getsizeof(value)
 
 
 class Analyzer():
-    def __init__(self, chatname: str) -> None:
-        self._manager = ChatManager(chatname)
+    def __init__(self, chatname: str, streaming: bool = False, workers: int = 1,
+                 use_cache: bool = True) -> None:
+        '''streaming: falls True wird der Chat nicht komplett eingelesen.
+                      Dann funktionieren nur Metriken, die in einem Durchlauf
+                      berechnet werden (user_msg_count, total_msg_count,
+                      user_avg_word_count, chat_avg_msg_per_day, chat_span,
+                      user_start_conversation, user_count_media,
+                      most_common_links und mit capacity user_most_common_words
+                      und user_most_common_emojis)
+           workers: Anzahl der Prozesse zum Einlesen des Chats (0 = alle Kerne)
+           use_cache: falls True wird der geparste Chat im "cache" Ordner gespeichert'''
+        self._manager = ChatManager(chatname, streaming=streaming, workers=workers,
+                                    use_cache=use_cache)
+        # Zwischenergebnisse unabhängig von Parametern wie n (siehe _memoize)
+        self._memo = {}
+        self._query_memo = OrderedDict()  # Schlüssel -> (Ergebnis, geschätzte Bytes), LRU
+        self._query_memo_bytes = 0
+        self._memo_lock = threading.Lock()  # der Server rechnet in mehreren Threads
+        self._memo_version = self._manager.version
+        self._memo_stats = Counter()
 
     @property
     def manager(self):
         return self._manager
 
+    def _iter_messages(self):
+        '''Return alle Nachrichten, im Streaming Modus direkt aus der Datei'''
+        if self.manager.streaming:
+            return self.manager.iter_messages()
+        return iter(self.manager.messages)
+
+    def _memoize(self, key: tuple, compute, keep: bool = False):
+        '''Return das Zwischenergebnis für key. compute() wird nur beim ersten Aufruf
+           ausgeführt bzw. wenn der ChatManager die Nachrichten neu eingelesen hat
+           keep: True für Ergebnisse, von denen es pro Chat nur wenige gibt (ohne Filter
+                 und frei wählbare Parameter), diese bleiben immer gespeichert.
+                 Alle anderen landen in einem LRU Speicher mit höchstens
+                 MEMO_MAX_ENTRIES Einträgen und MEMO_MAX_BYTES geschätzten Bytes.
+           Das Ergebnis wird geteilt und darf nicht verändert werden
+           (numpy Arrays werden deshalb schreibgeschützt)'''
+        with self._memo_lock:
+            if self._memo_version != self.manager.version:
+                self._clear_memo()
+                self._memo_version = self.manager.version
+            if keep and key in self._memo:
+                self._memo_stats["hits"] += 1
+                return self._memo[key]
+            if not keep and key in self._query_memo:
+                self._memo_stats["hits"] += 1
+                self._query_memo.move_to_end(key)
+                return self._query_memo[key][0]
+            self._memo_stats["misses"] += 1
+
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        size = 0 if keep else _estimate_size(value)
+        with self._memo_lock:
+            if keep:
+                self._memo[key] = value
+            elif key not in self._query_memo:
+                self._query_memo[key] = (value, size)
+                self._query_memo_bytes += size
+                while len(self._query_memo) > 1 and (
+                        len(self._query_memo) > MEMO_MAX_ENTRIES
+                        or self._query_memo_bytes > MEMO_MAX_BYTES):
+                    _, (_, old_size) = self._query_memo.popitem(last=False)
+                    self._query_memo_bytes -= old_size
+        return value
+
+    def _clear_memo(self) -> None:
+        self._memo.clear()
+        self._query_memo.clear()
+        self._query_memo_bytes = 0
+
+    def clear_memo(self) -> None:
+        '''Verwirft alle gespeicherten Zwischenergebnisse'''
+        with self._memo_lock:
+            self._clear_memo()
+
+    def memo_stats(self) -> dict:
+        '''Return {"hits", "misses", "entries", "query_entries", "query_bytes"} der
+           Zwischenergebnisse (query_*: Einträge mit Filtern / Parametern im LRU Speicher)'''
+        with self._memo_lock:
+            return {"hits": self._memo_stats["hits"],
+                    "misses": self._memo_stats["misses"],
+                    "entries": len(self._memo) + len(self._query_memo),
+                    "query_entries": len(self._query_memo),
+                    "query_bytes": self._query_memo_bytes}
+
     def _flatten(self, lst: list) -> list:
         '''Return die die Ursprungsliste nur mit einer Dimension
            (Unterlisten werden entfernt)'''
@@ -26,6 +144,8 @@ class Analyzer():
 
     def _get_percent(self, total: float, part: float):
         '''Return wie viel Prozent part von total ist'''
+        if part == 0:
+            return 0.0
         return 100 / (total / part)
 
     def _get_most_common(self, lst: list, n: int) -> list:
@@ -34,117 +154,582 @@ class Analyzer():
         c = Counter(lst)
         return c.most_common(n)
 
-    def user_msg_count(self) -> dict:
-        '''Return Anzahl der Nachrichten für jeden Nutzer'''
-        return {user: len(user.userrows) for user in self.manager.users}
+    @property
+    def message_index(self) -> MessageIndex:
+        '''Return sortierte Zeitstempel / Nachrichten pro Nutzer (für since, until und users)'''
+        return self._memoize(("message_index",), lambda: MessageIndex(self.manager.aggregates),
+                             keep=True)
+
+    def _select(self, since=None, until=None, users=None) -> Selection:
+        '''Return den Ausschnitt des Chats für die Filter, None ohne Filter
+           since: erster Zeitpunkt (inklusive), until: Ende (exklusive),
+                  jeweils datetime, date oder Text im ISO Format ("2020-01-31")
+           users: Nutzernamen oder User Objekte, deren Nachrichten zählen'''
+        if since is None and until is None and users is None:
+            return None
+        return self.message_index.select(since, until, users)
+
+    def _selected_users(self, selection: Selection) -> list:
+        '''Return die ausgewählten Nutzer (User Objekte)'''
+        if selection is None:
+            return self.manager.users
+        usernames = selection.usernames
+        return [user for user in self.manager.users if user.username in usernames]
+
+    def _filter_key(self, since=None, until=None, users=None) -> tuple:
+        '''Return die Filter als Schlüssel für _memoize (Streaming Modus)'''
+        if users is not None and not isinstance(users, str):
+            users = tuple(users)
+        return since, until, users
+
+    def _iter_selected(self, since=None, until=None, users=None):
+        '''Return die Nachrichten im Ausschnitt, im Streaming Modus direkt aus der
+           Datei gefiltert, sonst über die Nummern der Selection (ohne Kopie der Liste)'''
+        if not self.manager.streaming:
+            selection = self._select(since, until, users)
+            if selection is None:
+                return iter(self.manager.messages)
+            messages = self.manager.messages
+            return (messages[i] for i in selection.message_ids().tolist())
+
+        start = None if since is None else as_seconds(since)
+        end = None if until is None else as_seconds(until)
+        usernames = self._stream_usernames(users)
+        return (msg for msg in self._iter_messages()
+                if (start is None or to_seconds(msg.dateandtime) >= start)
+                and (end is None or to_seconds(msg.dateandtime) < end)
+                and (usernames is None or msg.username in usernames))
+
+    def _stream_usernames(self, users=None) -> set:
+        '''Return die Nutzernamen des users Filters (Streaming Modus), None ohne Filter'''
+        if users is None:
+            return None
+        if isinstance(users, str):
+            users = [users]
+        return {getattr(user, "username", user) for user in users}
+
+    def _heavy_hitters(self, capacity: int, since=None, until=None, users=None) -> dict:
+        '''Return {"words": {Nutzername: SpaceSaving}, "emojis": {Nutzername: SpaceSaving},
+                   "sites": SpaceSaving} aus einem Durchlauf über die Nachrichten
+           (im Streaming Modus direkt beim Parsen, der Speicher hängt nur von capacity
+           und der Anzahl der Nutzer ab, nicht von der Länge des Chats)'''
+        def compute():
+            streaming = self.manager.streaming
+            words = defaultdict(lambda: SpaceSaving(capacity))
+            emojis = defaultdict(lambda: SpaceSaving(capacity))
+            sites = SpaceSaving(capacity)
+            if not streaming:
+                # Worte aus den Wort ids der Zwischenergebnisse statt aus
+                # msg.words_without_stopwords, sonst bliebe an jeder Nachricht
+                # eine zusätzliche Liste hängen
+                aggregates = self.manager.aggregates
+                vocabulary = aggregates.vocabulary
+                stopword_count = vocabulary.stopword_count
+                selection = self._select(since, until, users)
+                index = self.message_index
+                for code in range(len(index.usernames)) if selection is None else selection.codes:
+                    tokens = index.user_tokens(code) if selection is None \
+                        else selection.user_tokens(code)
+                    if len(tokens):
+                        words[index.usernames[code]].update(
+                            vocabulary.word(token_id) for token_id in tokens.tolist()
+                            if token_id >= stopword_count)
+
+            for msg in self._iter_selected(since, until, users):
+                if streaming and msg.words is not None:
+                    words[msg.username].update(msg.words_without_stopwords)
+                if msg.body is not None:
+                    # extract_emojis statt msg.emojis, aus demselben Grund wie oben
+                    emojis[msg.username].update(extract_emojis(msg.body))
+                    sites.update(link_site(url) for url in msg.links)
+            return {"words": dict(words), "emojis": dict(emojis), "sites": sites}
 
-    def total_msg_count(self) -> int:
+        return self._memoize(("heavy_hitters", capacity, self._filter_key(since, until, users)),
+                             compute)
+
+    def _approximate_rankings(self, kind: str, n: int, capacity: int,
+                              since=None, until=None, users=None) -> dict:
+        '''Return {User: [(Element, geschätzte Anzahl), ...]} aus den SpaceSaving
+           Zählern (im Streaming Modus gibt es keine Nutzerliste, dann User Objekte
+           ohne userrows für alle Nutzer mit Nachrichten im Ausschnitt)'''
+        sketches = self._heavy_hitters(capacity, since, until, users)[kind]
+        if self.manager.streaming:
+            return {user: sketches[user.username].most_common(n)
+                    for user in self._stream_user_keys(sketches)}
+        return {user: sketches[user.username].most_common(n) if user.username in sketches else []
+                for user in self._selected_users(self._select(since, until, users))}
+
+    def _stream_users(self, since=None, until=None, users=None) -> dict:
+        '''Return {Nutzername: {"msg_count", "word_total", "media": Counter}} in einem
+           Durchlauf über die Datei (Streaming Modus, nur Nutzer mit Nachrichten im Ausschnitt)'''
+        def compute():
+            d = {}
+            for msg in self._iter_selected(since, until, users):
+                stats = d.get(msg.username)
+                if stats is None:
+                    stats = d[msg.username] = {"msg_count": 0, "word_total": 0,
+                                               "media": Counter()}
+                stats["msg_count"] += 1
+                if msg.words is not None:
+                    stats["word_total"] += len(msg.words)
+                if msg.mediatype is not None:
+                    stats["media"][msg.mediatype] += 1
+            return d
+
+        return self._memoize(("stream_users", self._filter_key(since, until, users)), compute)
+
+    def _stream_starts(self, gap: float = None, since=None, until=None) -> Counter:
+        '''Return {Nutzername: Anzahl gestarteter Unterhaltungen} in einem Durchlauf über
+           die Datei (Streaming Modus, wie sessions.session_starts mit allen Nutzern)'''
+        def compute():
+            starts = Counter()
+            previous = None
+            for msg in self._iter_selected(since, until):
+                seconds = to_seconds(msg.dateandtime)
+                if previous is None:
+                    started = True
+                elif gap is None:
+                    started = seconds // SECONDS_PER_DAY != previous // SECONDS_PER_DAY
+                else:
+                    started = seconds - previous > gap * 60
+                starts[msg.username] += started
+                previous = seconds
+            return starts
+
+        return self._memoize(("stream_starts", gap, self._filter_key(since, until)), compute)
+
+    def _stream_user_keys(self, usernames) -> list:
+        '''Return User Objekte ohne userrows (im Streaming Modus gibt es keine Nutzerliste)'''
+        return [User(username, []) for username in sorted(usernames)]
+
+    @profiled
+    def user_msg_count(self, since=None, until=None, users=None) -> dict:
+        '''Return Anzahl der Nachrichten für jeden Nutzer
+           since / until / users: nur Nachrichten in diesem Ausschnitt (siehe _select),
+                                  das gilt genauso für alle anderen Metriken'''
+        if self.manager.streaming:
+            stats = self._stream_users(since, until, users)
+            return {user: stats[user.username]["msg_count"]
+                    for user in self._stream_user_keys(stats)}
+
+        selection = self._select(since, until, users)
+        if selection is None:
+            msg_count = self.manager.aggregates.msg_count
+            return {user: msg_count[user.username] for user in self.manager.users}
+
+        counts = self._memoize(("msg_count", selection.key), selection.user_counts)
+        index = self.message_index
+        return {user: int(counts[index.user_code(user)])
+                for user in self._selected_users(selection)}
+
+    @profiled
+    def total_msg_count(self, since=None, until=None, users=None) -> int:
         '''Return die Gesamtanzahl der Nachrichten im Chat'''
-        return len(self.manager.messages)
+        if self.manager.streaming:
+            return self._stream_span(since, until, users)[0]
+        selection = self._select(since, until, users)
+        if selection is None:
+            return len(self.manager.aggregates.timestamps)
+        return len(selection)
 
-    def user_all_words(self, include_stopwords=True) -> list:
+    @profiled
+    def user_all_words(self, include_stopwords=True, since=None, until=None, users=None) -> list:
         '''Return eine Liste mit allen Wörtern in jeder Nachricht für jeden Nutzer'''
-        d = {}
-        for user in self.manager.users:
-            all_words = []
-            # Nachrichten rausfiltern, die keine Wörter enthalten (z.B. Medien)
-            word_rows = [msg for msg in user.userrows if msg.words is not None]
-            # Entferne Datum / Name von jeder Nachricht
-            for msg in word_rows:
-                # Füge alle Worte aus allen Nachrichten zu all_words hinzu
-                if include_stopwords:
-                    all_words.extend(msg.words)
-                else:
-                    all_words.extend(msg.words_without_stopwords)
-            d[user] = all_words
-        return d
+        aggregates = self.manager.aggregates
+        selection = self._select(since, until, users)
+        # gespeichert als Tupel, zurückgegeben als eigene Liste für den Aufrufer
+        if selection is None:
+            return {user: list(self._memoize(
+                        ("words", user.username, include_stopwords),
+                        lambda: tuple(aggregates.words(user.username, include_stopwords)),
+                        keep=True))
+                    for user in self.manager.users}
+
+        index = self.message_index
+        return {user: list(self._memoize(
+                    ("words", user.username, include_stopwords, selection.key),
+                    lambda: tuple(aggregates.words(user.username, include_stopwords,
+                                                   selection.user_tokens(index.user_code(user))))))
+                for user in self._selected_users(selection)}
 
-    def user_avg_word_count(self) -> dict:
+    @profiled
+    def user_avg_word_count(self, since=None, until=None, users=None) -> dict:
         '''Return die durschnittliche Anzahl an Wörtern pro Nachricht für jeden Nutzer'''
-        all_words = self.user_all_words()
-        return {user: len(all_words[user]) / len(user.userrows)
-                for user in self.manager.users}
+        if self.manager.streaming:
+            stats = self._stream_users(since, until, users)
+            return {user: stats[user.username]["word_total"] / stats[user.username]["msg_count"]
+                    for user in self._stream_user_keys(stats)}
+
+        aggregates = self.manager.aggregates
+        selection = self._select(since, until, users)
+        if selection is None:
+            return {user: aggregates.word_total(user.username) / aggregates.msg_count[user.username]
+                    for user in self.manager.users}
+
+        index = self.message_index
+        counts = self._memoize(("msg_count", selection.key), selection.user_counts)
+        d = {}
+        for user in self._selected_users(selection):
+            code = index.user_code(user)
+            d[user] = len(selection.user_tokens(code)) / counts[code] if counts[code] else 0.0
+        return d
 
 
-    def chat_avg_msg_per_day(self) -> float:
+    @profiled
+    def chat_avg_msg_per_day(self, since=None, until=None, users=None) -> float:
         '''Return die durchschnittliche Anzahl an Nachrichten pro Tag in einem Chat'''
-        content = self.manager.messages
-        first_day = content[0].dateandtime
-        last_day = content[-1].dateandtime
-        deltadays = (last_day - first_day).days
-        return self.total_msg_count() / deltadays
-
-    def most_common_links(self, n: int = 5) -> dict:
-        '''Return die n am häufigsten vorkommenden Websites'''
-        all_sites = [url.netloc for msg in self._manager.messages for url in msg.links]
-        # remove "www." prefix
-        no_prefix = []
-        for site in all_sites:
-            prefix = "www."
-            if site.startswith(prefix):
-                no_prefix.append(site[len(prefix):])
-            else:
-                no_prefix.append(site)
+        msg_count = self.total_msg_count(since, until, users)
+        if msg_count == 0:
+            return 0.0
+        first_day, last_day = self.chat_span(since, until, users)
+        # mindestens ein Tag, sonst teilt ein Ausschnitt von wenigen Stunden durch 0
+        deltadays = max((last_day - first_day).days, 1)
+        return msg_count / deltadays
+
+    @profiled
+    def chat_span(self, since=None, until=None, users=None) -> tuple:
+        '''Return (Zeitpunkt der ersten, Zeitpunkt der letzten Nachricht) als datetime,
+           (None, None) ohne Nachrichten'''
+        if self.manager.streaming:
+            return self._stream_span(since, until, users)[1:]
+        selection = self._select(since, until, users)
+        if selection is None:
+            timestamps = self.manager.aggregates.timestamps
+        else:
+            timestamps = self.message_index.timestamps[selection.positions]
+        if len(timestamps) == 0:
+            return None, None
+        return (EPOCH + timedelta(seconds=int(timestamps[0])),
+                EPOCH + timedelta(seconds=int(timestamps[-1])))
+
+    def _stream_span(self, since=None, until=None, users=None) -> tuple:
+        '''Return (Anzahl, erster, letzter Zeitstempel) in einem Durchlauf
+           (Streaming Modus, für total_msg_count, chat_span und chat_avg_msg_per_day)'''
+        def compute():
+            msg_count = 0
+            first_day = last_day = None
+            for msg in self._iter_selected(since, until, users):
+                if first_day is None:
+                    first_day = msg.dateandtime
+                last_day = msg.dateandtime
+                msg_count += 1
+            return msg_count, first_day, last_day
+
+        return self._memoize(("chat_span", self._filter_key(since, until, users)), compute)
+
+    def _buckets(self, by: str, selection: Selection = None) -> tuple:
+        if by not in ("hour", "weekday", "week"):
+            raise ValueError(
+                f"Den Modus '{by}' gibt es nicht. Versuch es mal mit 'hour', 'weekday' oder 'week'")
+        aggregates = self.manager.aggregates
+        if selection is None:
+            return self._memoize(("buckets", by), lambda: bucket_counts(
+                aggregates.timestamps, aggregates.user_codes, len(aggregates.usernames), by),
+                keep=True)
 
-        return self._get_most_common(no_prefix, n)
+        positions = selection.positions
+        return self._memoize(("buckets", by, selection.key), lambda: bucket_counts(
+            aggregates.timestamps[positions], aggregates.user_codes[positions],
+            len(aggregates.usernames), by))
 
-    def user_most_common_words(self, n: int = 5) -> dict:
+    @profiled
+    def msg_count_by(self, by: str = "week", since=None, until=None, users=None) -> dict:
+        '''Return Anzahl der Nachrichten pro Zeitabschnitt (leere Abschnitte mit 0)
+           by: "hour" (0-23), "weekday" (0 = Montag) oder
+               "week" (Datum des Sonntags am Ende der Woche)'''
+        keys, counts = self._buckets(by, self._select(since, until, users))
+        return dict(zip(keys, counts.sum(axis=0).tolist()))
+
+    @profiled
+    def user_msg_count_by(self, by: str = "week", since=None, until=None, users=None) -> dict:
+        '''Return Anzahl der Nachrichten pro Zeitabschnitt für jeden Nutzer
+           by: wie bei msg_count_by
+           Returntype: {user: {Abschnitt: Anzahl}}'''
+        selection = self._select(since, until, users)
+        keys, counts = self._buckets(by, selection)
+        code = {username: i for i, username in enumerate(self.manager.aggregates.usernames)}
+        return {user: dict(zip(keys, counts[code[user.username]].tolist()))
+                for user in self._selected_users(selection)}
+
+    @profiled
+    def most_common_links(self, n: int = 5, since=None, until=None, users=None,
+                          capacity: int = None) -> dict:
+        '''Return die n am häufigsten vorkommenden Websites
+           capacity: falls gesetzt, wird mit festem Speicher gezählt (höchstens capacity
+                     Websites, siehe heavyhitters.SpaceSaving). Jede Anzahl ist dann
+                     höchstens um (alle Links) / capacity zu hoch, jede häufigere
+                     Website ist sicher dabei'''
+        if capacity is not None:
+            return self._heavy_hitters(capacity, since, until, users)["sites"].most_common(n)
+
+        def count_sites():
+            return Counter(link_site(url) for msg in self._iter_selected(since, until, users)
+                           if msg.body is not None for url in msg.links).most_common()
+
+        if self.manager.streaming:
+            ranking = self._memoize(("sites", self._filter_key(since, until, users)), count_sites)
+        else:
+            selection = self._select(since, until, users)
+            if selection is None:
+                ranking = self._memoize(("sites",), self.manager.aggregates.sites.most_common,
+                                        keep=True)
+            else:
+                ranking = self._memoize(("sites", selection.key), count_sites)
+        return ranking[:n]
+
+    @profiled
+    def user_most_common_words(self, n: int = 5, since=None, until=None, users=None,
+                               capacity: int = None) -> dict:
         '''Return die n am häufigsten verwendeten Worte jedes Nutzers
-           (Worte aus stopwords.py werden ignoriert)'''
-        user_words = self.user_all_words(include_stopwords=False)
-        return {user: self._get_most_common(user_words[user], n)
-                for user in self.manager.users}
-
-    def user_start_conversation(self) -> dict:
-        '''Return den Anteil der Tage an denen der Nutzer
-           die Unterhaltung gestartet hat (in Prozent) für jeden Nutzer'''
-        d = {}
-        for user in self.manager.users:
-            start_counter = 0  # zählen, wie oft der Nutzer die Unterhaltung anfängt
-            last_date = None
-            for msg in self.manager.messages:
-                # immer nur die erste Nachricht des Tages überprüfen
-                date = msg.dateandtime.date()
-                if date != last_date:
-                    last_date = date
-                    if msg.username == user.username:
-                        start_counter += 1
-            d[user] = start_counter  # absolute Zahlen, kein Prozent
-
-        # Gesamtanzahl der Tage, an denen geschrieben wurde
+           (Worte aus stopwords.py werden ignoriert)
+           capacity: falls gesetzt, wird mit festem Speicher gezählt (höchstens capacity
+                     Worte pro Nutzer, siehe heavyhitters.SpaceSaving). Jede Anzahl ist
+                     dann höchstens um (Worte des Nutzers) / capacity zu hoch, jedes
+                     häufigere Wort ist sicher dabei. Geht auch im Streaming Modus'''
+        if capacity is not None:
+            return self._approximate_rankings("words", n, capacity, since, until, users)
+
+        aggregates = self.manager.aggregates
+        vocabulary_size = len(aggregates.vocabulary)
+        selection = self._select(since, until, users)
+        if selection is None:
+            # komplette Rangliste einmal bestimmen, danach reicht ein Slice für jedes n
+            return {user: self._memoize(("word_ranking", user.username),
+                                        lambda: aggregates.most_common_words(user.username,
+                                                                             vocabulary_size),
+                                        keep=True)[:n]
+                    for user in self.manager.users}
+
+        index = self.message_index
+        return {user: self._memoize(
+                    ("word_ranking", user.username, selection.key),
+                    lambda: aggregates.most_common_words(
+                        user.username, vocabulary_size,
+                        tokens=selection.user_tokens(index.user_code(user))))[:n]
+                for user in self._selected_users(selection)}
+
+    def _sessions(self, gap: float = None, selection: Selection = None) -> dict:
+        aggregates = self.manager.aggregates
+        if selection is None:
+            return self._memoize(("sessions", gap), lambda: sessions(
+                aggregates.timestamps, aggregates.user_codes, len(aggregates.usernames), gap))
+
+        # Unterhaltungen im Zeitfenster mit allen Nutzern bestimmen,
+        # users wählt nur aus, welche Nutzer im Ergebnis stehen
+        window = selection.window
+        return self._memoize(("sessions", gap, selection.window_key), lambda: sessions(
+            aggregates.timestamps[window], aggregates.user_codes[window],
+            len(aggregates.usernames), gap))
+
+    @profiled
+    def user_start_conversation(self, gap: float = None,
+                                since=None, until=None, users=None) -> dict:
+        '''Return den Anteil der Unterhaltungen, die der Nutzer
+           gestartet hat (in Prozent) für jeden Nutzer
+           gap: None -> Unterhaltung = Kalendertag,
+                sonst beginnt nach mehr als gap Minuten Stille eine neue Unterhaltung'''
+        if self.manager.streaming:
+            # wie unten: Unterhaltungen im Zeitfenster mit allen Nutzern,
+            # users wählt nur aus, welche Nutzer im Ergebnis stehen
+            starts = self._stream_starts(gap, since, until)
+            day_total = sum(starts.values())
+            usernames = self._stream_usernames(users)
+            usernames = starts.keys() if usernames is None else usernames & starts.keys()
+            return {user: self._get_percent(day_total, starts[user.username])
+                    for user in self._stream_user_keys(usernames)}
+
+        selection = self._select(since, until, users)
+        # zählen, wie oft jeder Nutzer die erste Nachricht einer Unterhaltung schreibt
+        starts = self._sessions(gap, selection)["starts"]
+        code = {username: i for i, username in enumerate(self.manager.aggregates.usernames)}
+        d = {user: int(starts[code[user.username]])  # absolute Zahlen, kein Prozent
+             for user in self.manager.users}
+
+        # Gesamtanzahl der Unterhaltungen
         day_total = sum(d.values())
-        for user in d:
-            d[user] = self._get_percent(day_total, d[user])
-        return d
+        return {user: self._get_percent(day_total, d[user])
+                for user in self._selected_users(selection)}
 
-    def user_most_common_emojis(self, n: int = 5, as_text: bool = False) -> dict:
-        '''Return die n am häufigsten verwendeten Emojis jedes Nutzers'''
+    @profiled
+    def user_sessions(self, gap: float = None, since=None, until=None, users=None) -> dict:
+        '''Return für jeden Nutzer, wie viele Unterhaltungen er gestartet hat und wie
+           groß (Nachrichten) und lang (Minuten) diese im Durchschnitt waren
+           gap: wie bei user_start_conversation
+           Returntype: {user: {"starts": int, "avg_size": float, "avg_length": float}}'''
+        selection = self._select(since, until, users)
+        result = self._sessions(gap, selection)
+        code = {username: i for i, username in enumerate(self.manager.aggregates.usernames)}
         d = {}
+        for user in self._selected_users(selection):
+            mask = result["starters"] == code[user.username]
+            started = int(mask.sum())
+            d[user] = {"starts": started,
+                       "avg_size": float(result["sizes"][mask].mean()) if started else 0.0,
+                       "avg_length": float(result["lengths"][mask].mean()) if started else 0.0}
+        return d
+
+    def _replies(self, gap: float, percentiles: tuple = (25, 50, 75, 90),
+                 selection: Selection = None) -> dict:
+        aggregates = self.manager.aggregates
+        if selection is None:
+            return self._memoize(("replies", gap, tuple(percentiles)), lambda: replies(
+                aggregates.timestamps, aggregates.user_codes, len(aggregates.usernames),
+                gap, percentiles))
+
+        # wie bei _sessions: Antworten im Zeitfenster unter allen Nutzern
+        window = selection.window
+        return self._memoize(
+            ("replies", gap, tuple(percentiles), selection.window_key),
+            lambda: replies(aggregates.timestamps[window], aggregates.user_codes[window],
+                            len(aggregates.usernames), gap, percentiles))
+
+    @profiled
+    def user_reply_latency(self, gap: float = 60, percentiles: tuple = (25, 50, 75, 90),
+                           since=None, until=None, users=None) -> dict:
+        '''Return Antwortzeiten (in Minuten) für jeden Nutzer
+           gap: längere Pausen (in Minuten) zählen nicht als Antwort
+           Returntype: {user: {Perzentil: Minuten}} (50 = Median)'''
+        selection = self._select(since, until, users)
+        result = self._replies(gap, percentiles, selection)["percentiles"]
+        code = {username: i for i, username in enumerate(self.manager.aggregates.usernames)}
+        return {user: {p: float(result[p][code[user.username]]) for p in percentiles}
+                for user in self._selected_users(selection)}
 
-        for user in self.manager.users:
-            user_emojis = [
-                msg.emojitexts for msg in user.userrows if msg.emojitexts is not None]
-            # Dimensionen auflösen
+    @profiled
+    def reply_matrix(self, gap: float = 60, mode: str = "count",
+                     since=None, until=None, users=None) -> dict:
+        '''Return wer wem wie oft / wie schnell antwortet
+           mode: "count" (Anzahl der Antworten) oder "latency" (durchschnittliche Minuten)
+           Returntype: {Antwortender: {Angeschriebener: Wert}}'''
+        selection = self._select(since, until, users)
+        if mode == "count":
+            matrix = self._replies(gap, selection=selection)["counts"]
+        elif mode == "latency":
+            matrix = self._replies(gap, selection=selection)["mean_latency"]
+        else:
+            raise ValueError(
+                f"Den Modus '{mode}' gibt es nicht. Versuch es mal mit 'count' oder 'latency'")
+
+        code = {username: i for i, username in enumerate(self.manager.aggregates.usernames)}
+        selected = self._selected_users(selection)
+        return {replier: {replied_to: matrix[code[replier.username], code[replied_to.username]].item()
+                          for replied_to in selected}
+                for replier in selected}
+
+    @profiled
+    def user_most_common_emojis(self, n: int = 5, as_text: bool = False,
+                                since=None, until=None, users=None,
+                                capacity: int = None) -> dict:
+        '''Return die n am häufigsten verwendeten Emojis jedes Nutzers
+           capacity: wie bei user_most_common_words (höchstens capacity Emojis pro Nutzer)'''
+        if capacity is not None:
+            rankings = self._approximate_rankings("emojis", n, capacity, since, until, users)
             if as_text:
-                user_emojis = [emj.replace(":", "") for emj in self._flatten(user_emojis)]
-            else:
-                user_emojis = [emoji.emojize(emj)
-                               for emj in self._flatten(user_emojis)]
+                rankings = {user: [(emoji_name(emj), count) for emj, count in most_common]
+                            for user, most_common in rankings.items()}
+            return rankings
 
-            d[user] = self._get_most_common(user_emojis, n)
+        d = {}
+        selection = self._select(since, until, users)
+        user_emojis = self.manager.aggregates.emojis
+        for user in self._selected_users(selection):
+            # gezählt wird nach Zeichen, Namen nur für die n häufigsten
+            if selection is None:
+                most_common = self._memoize(
+                    ("emoji_ranking", user.username),
+                    lambda: user_emojis.get(user.username, Counter()).most_common(),
+                    keep=True)[:n]
+            else:
+                # Emojis werden nicht pro Nachricht gespeichert, also nur die
+                # Texte im Ausschnitt erneut durchsuchen
+                positions = selection.user_positions(self.message_index.user_code(user))
+                messages = self.manager.messages
+                most_common = self._memoize(
+                    ("emoji_ranking", user.username, selection.key),
+                    lambda: count_emojis(messages[i].body for i in positions.tolist()
+                                         if messages[i].body is not None).most_common())[:n]
+            if as_text:
+                most_common = [(emoji_name(emj), count) for emj, count in most_common]
+            d[user] = most_common
 
         return d
 
-    def user_count_media(self, n: int = 5, sum_only = False):
+    @profiled
+    def user_count_media(self, n: int = 5, sum_only = False,
+                         since=None, until=None, users=None):
         '''Return wie oft ein jeweiliges Medium verschickt wurde'''
+        if self.manager.streaming:
+            stats = self._stream_users(since, until, users)
+            d = {user: stats[user.username]["media"].most_common(n)
+                 for user in self._stream_user_keys(stats)}
+            if sum_only:
+                d = {user: sum(count for _, count in most_common)
+                     for user, most_common in d.items()}
+            return d
+
         d = {}
-        for user in self.manager.users:
-            # Liste mit allen medien, die ein Nutzer versendet hat
-            all_media = [msg.mediatype for msg in user.userrows
-                         if msg.mediatype is not None]
-            d[user] = self._get_most_common(all_media, n)
+        selection = self._select(since, until, users)
+        aggregates = self.manager.aggregates
+        user_media = aggregates.media
+        for user in self._selected_users(selection):
+            if selection is None:
+                d[user] = self._memoize(
+                    ("media_ranking", user.username),
+                    lambda: user_media.get(user.username, Counter()).most_common(),
+                    keep=True)[:n]
+            else:
+                media_codes = aggregates.media_codes[
+                    selection.user_positions(self.message_index.user_code(user))]
+                d[user] = self._memoize(
+                    ("media_ranking", user.username, selection.key),
+                    lambda: Counter(aggregates.mediatypes[code] for code in media_codes.tolist()
+                                    if code >= 0).most_common())[:n]
             if sum_only:
                 media_sum = sum([tup[1] for tup in d[user]])
                 d[user] = media_sum
 
         return d
+
+    def _search_ids(self, query: str, mode: str = "and", selection: Selection = None):
+        '''Return sortierte Nummern der Nachrichten, die zur Suche passen'''
+        # wie die Nachrichten zerlegen, sonst findet z.B. "pizza!" nichts
+        terms = tokenize(query)
+        index = self.manager.aggregates.index
+        if mode == "and":
+            ids = self._memoize(("search", tuple(terms), mode),
+                                lambda: index.query_all(terms))
+        elif mode == "or":
+            ids = self._memoize(("search", tuple(terms), mode),
+                                lambda: index.query_any(terms))
+        else:
+            raise ValueError(
+                f"Den Modus '{mode}' gibt es nicht. Versuch es mal mit 'and' oder 'or'")
+        if selection is None:
+            return ids
+        return ids[selection.contains(ids)]
+
+    @profiled
+    def search(self, query: str, mode: str = "and", since=None, until=None, users=None) -> list:
+        '''Return alle Nachrichten, die die Worte aus query enthalten
+           mode: "and" (alle Worte) oder "or" (mindestens ein Wort)'''
+        messages = self.manager.messages
+        selection = self._select(since, until, users)
+        return [messages[i] for i in self._search_ids(query, mode, selection)]
+
+    @profiled
+    def user_term_count(self, query: str, mode: str = "and",
+                        since=None, until=None, users=None) -> dict:
+        '''Return wie viele Nachrichten jedes Nutzers zur Suche passen'''
+        c = Counter(msg.username for msg in self.search(query, mode, since, until, users))
+        return {user: c[user.username]
+                for user in self._selected_users(self._select(since, until, users))}
+
+    @profiled
+    def term_over_time(self, query: str, mode: str = "and",
+                       since=None, until=None, users=None) -> dict:
+        '''Return Anzahl der passenden Nachrichten pro Woche (nur Wochen mit Treffern)
+           Returntype: {Sonntag am Ende der Woche (date): Anzahl}, wie msg_count_by("week")'''
+        ids = self._search_ids(query, mode, self._select(since, until, users))
+        week_ids, weeks = bucket_ids(self.manager.aggregates.timestamps[ids], "week")
+        counts = np.bincount(week_ids, minlength=len(weeks))
+        return {week: count for week, count in zip(weeks, counts.tolist()) if count}
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from glob import glob
+import hashlib
+import html
+import json
+import os
+from os import path
+
+from reporter import Reporter
+
+
+def find_chats(pattern: str) -> list:
+    '''Return alle Chatdateien in einem Ordner (*.txt) oder passend zu einem Glob Muster
+       ("**" steht auch für beliebig viele Unterordner, z.B. "chats/**/*.txt")'''
+    if path.isdir(pattern):
+        pattern = path.join(pattern, "*.txt")
+    return sorted(filepath for filepath in glob(pattern, recursive=True) if path.isfile(filepath))
+
+
+def output_names(chats: list) -> dict:
+    '''Return {Chatdatei: Name für Plotordner und Reports}. Normalerweise der Dateiname
+       in Kleinbuchstaben (wie im Reporter), gleiche Namen aus verschiedenen Ordnern
+       oder mit anderer Groß- / Kleinschreibung bekommen den Ordnernamen angehängt,
+       falls auch der nicht reicht einen Hash des Pfads'''
+    def base(filepath):
+        return path.splitext(path.basename(filepath))[0].lower()
+
+    def with_folder(filepath):
+        folder = path.basename(path.dirname(path.abspath(filepath))).lower()
+        return f"{base(filepath)}_{folder}"
+
+    base_counts = Counter(base(filepath) for filepath in chats)
+    folder_counts = Counter(with_folder(filepath) for filepath in chats)
+    names = {}
+    for filepath in chats:
+        if base_counts[base(filepath)] == 1:
+            names[filepath] = base(filepath)
+        elif folder_counts[with_folder(filepath)] == 1 \
+                and with_folder(filepath) not in base_counts:
+            names[filepath] = with_folder(filepath)
+        else:
+            digest = hashlib.sha1(path.abspath(filepath).encode("utf-8")).hexdigest()[:8]
+            names[filepath] = f"{base(filepath)}_{digest}"
+    return names
+
+
+def report_chat(args: tuple) -> dict:
+    '''Erstellt Graphen und Report für einen Chat (läuft im Worker Prozess),
+       ohne plots nur die Ergebnisse als JSON
+       Return Zusammenfassung des Chats, bei Fehlern {"chat", "status": "error", "error"}'''
+    filepath, name, interactive, use_cache, plots = args
+    chat = path.basename(filepath)
+    try:
+        reporter = Reporter(filepath, use_cache=use_cache, output_name=name)
+        reporter.folder_setup(plots)
+        if not plots:
+            report = reporter.export_json()
+        else:
+            if not interactive:
+                reporter.export_graphs()
+            reporter.create_html_report(interactive=interactive, recent=False)
+            report = reporter.report_path
+
+        analyzer = reporter.analyzer
+        first_message, last_message = analyzer.chat_span()
+        return {"chat": chat,
+                "path": filepath,
+                "status": "ok",
+                "report": report,
+                "messages": analyzer.total_msg_count(),
+                "first_message": first_message.isoformat(),
+                "last_message": last_message.isoformat(),
+                "avg_msg_per_day": analyzer.chat_avg_msg_per_day(),
+                "users": {user.username: count
+                          for user, count in analyzer.user_msg_count().items()}}
+    except Exception as e:
+        # ein fehlerhafter Chat soll nicht den ganzen Batch abbrechen
+        return {"chat": chat, "path": filepath, "status": "error",
+                "error": f"{type(e).__name__}: {e}"}
+
+
+def _index_html(summaries: list) -> str:
+    '''Return die Übersichtsseite mit Links zu allen Reports'''
+    rows = []
+    chat_counts = Counter(summary["chat"].lower() for summary in summaries)
+    for summary in summaries:
+        # bei gleichen Dateinamen den Pfad zeigen, damit die Zeilen unterscheidbar sind
+        chat = html.escape(summary["chat"] if chat_counts[summary["chat"].lower()] == 1
+                           else summary["path"])
+        if summary["status"] == "ok":
+            report = html.escape(path.basename(summary["report"]))
+            rows.append(f'''        <tr>
+          <td><a href="{report}">{chat}</a></td>
+          <td>{summary["messages"]}</td>
+          <td>{len(summary["users"])}</td>
+          <td>{round(summary["avg_msg_per_day"], 1)}</td>
+          <td>{summary["first_message"][:10]} - {summary["last_message"][:10]}</td>
+        </tr>''')
+        else:
+            rows.append(f'''        <tr class="table-danger">
+          <td>{chat}</td>
+          <td colspan="4">{html.escape(summary["error"])}</td>
+        </tr>''')
+    rows = "\n".join(rows)
+
+    return f'''<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <link
+      rel="stylesheet"
+      href="https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0/css/bootstrap.min.css"
+      integrity="sha384-Gn5384xqQ1aoWXA+058RXPxPg6fy4IWvTNh0E263XmFcJlSAwiGgFAW/dAiS6JXm"
+      crossorigin="anonymous"
+    />
+  </head>
+
+  <body>
+    <div class="jumbotron bg-info text-white text-center">
+      <h1 class="display-4">WhatsApp Reports</h1>
+    </div>
+
+    <div class="container">
+      <table class="table">
+        <tr>
+          <th>Chat</th>
+          <th>Nachrichten</th>
+          <th>Nutzer</th>
+          <th>Nachrichten pro Tag</th>
+          <th>Zeitraum</th>
+        </tr>
+{rows}
+      </table>
+    </div>
+  </body>
+</html>
+'''
+
+
+def run_batch(pattern: str, workers: int = 0, interactive: bool = False,
+              use_cache: bool = True, plots: bool = True) -> list:
+    '''Erstellt Reports für alle Chats in einem Ordner / Glob Muster
+       und schreibt reports/index.html und reports/summary.json
+       workers: Anzahl der Prozesse (0 = alle Kerne), jeder Prozess bearbeitet einen Chat
+       plots: falls False werden statt Graphen und HTML Reports nur JSON Ergebnisse gespeichert
+       Return Liste mit der Zusammenfassung jedes Chats'''
+    chats = find_chats(pattern)
+    project_basedir = path.dirname(os.getcwd())  # Projekt Root
+    reports_dir = path.join(project_basedir, "reports")
+    # gemeinsame Ordner vorher anlegen, damit sich die Prozesse nicht in die Quere kommen
+    for folder in ("plots", "reports") if plots else ("reports",):
+        os.makedirs(path.join(project_basedir, folder), exist_ok=True)
+
+    # gleiche Dateinamen würden sonst dieselben Plots / Reports überschreiben
+    names = output_names(chats)
+    jobs = [(filepath, names[filepath], interactive, use_cache, plots) for filepath in chats]
+    workers = min(workers if workers > 0 else os.cpu_count(), len(jobs))
+    if workers <= 1:
+        summaries = [report_chat(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            summaries = list(executor.map(report_chat, jobs))
+
+    with open(path.join(reports_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, ensure_ascii=False, indent=2)
+    with open(path.join(reports_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(_index_html(summaries))
+    return summaries
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime
+import gc
+import io
+import json
+import os
+from os import path
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import globals_
+from synthetic import ChatGenerator
+
+# ab diesem Verhältnis zur Baseline wird eine Stufe als langsamer markiert
+REGRESSION_RATIO = 1.2
+
+
+def measure(func, memory: bool = True) -> tuple:
+    '''Return (Ergebnis von func(), {"seconds": Laufzeit, "peak_mb": Speicherspitze})
+       Die Speicherspitze wird in einem zweiten Aufruf mit tracemalloc gemessen,
+       damit die Zeitmessung nicht verfälscht wird (Worker Prozesse zählen nicht mit)'''
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    stats = {"seconds": time.perf_counter() - start}
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return result, stats
+
+
+def _metrics(analyzer) -> dict:
+    '''Return {Name: Funktion} aller gemessenen Analyzer Metriken'''
+    return {
+        "user_msg_count": analyzer.user_msg_count,
+        "total_msg_count": analyzer.total_msg_count,
+        "user_all_words": analyzer.user_all_words,
+        "user_avg_word_count": analyzer.user_avg_word_count,
+        "chat_avg_msg_per_day": analyzer.chat_avg_msg_per_day,
+        "most_common_links": analyzer.most_common_links,
+        "user_most_common_words": analyzer.user_most_common_words,
+        "user_start_conversation": analyzer.user_start_conversation,
+        "user_sessions": analyzer.user_sessions,
+        "user_reply_latency": analyzer.user_reply_latency,
+        "reply_matrix": analyzer.reply_matrix,
+        "user_most_common_emojis": lambda: analyzer.user_most_common_emojis(as_text=True),
+        "user_count_media": analyzer.user_count_media,
+        "msg_count_by": analyzer.msg_count_by,
+        "search": lambda: analyzer.search("pizza kino", mode="or"),
+        "term_over_time": lambda: analyzer.term_over_time("pizza"),
+    }
+
+
+def _plots(plotter, analyzer, plot_dir: str) -> dict:
+    '''Return {Name: Funktion} aller gemessenen Plots'''
+    def export(name):
+        return path.join(plot_dir, f"{name}.png")
+
+    return {
+        "plot_total_messages_over_time": lambda: plotter.plot_total_messages_over_time(
+            export_path=export("msg_per_week")),
+        "plot_user_messages_over_time": lambda: plotter.plot_user_messages_over_time(
+            export_path=export("msg_per_person_per_week")),
+        "plot_group_messeges_by_hour": lambda: plotter.plot_group_messeges_by(
+            "hour", export_path=export("msg_by_hour")),
+        "plot_group_messeges_by_weekday": lambda: plotter.plot_group_messeges_by(
+            "weekday", export_path=export("msg_by_weekday")),
+        "plot_user_vs_number_dict_pie": lambda: plotter.plot_user_vs_number_dict(
+            analyzer.user_msg_count(), mode="pie", export_path=export("msg_per_user")),
+        "plot_user_vs_number_dict_bar": lambda: plotter.plot_user_vs_number_dict(
+            analyzer.user_avg_word_count(), mode="bar", export_path=export("msg_len_per_user")),
+        "plot_reply_matrix": lambda: plotter.plot_reply_matrix(
+            analyzer.reply_matrix(), export_path=export("reply_matrix")),
+    }
+
+
+def run_chat(chatname: str, workers: int = 1, memory: bool = True,
+             plots: bool = True, report: bool = True) -> dict:
+    '''Misst alle Stufen für einen Chat im "chats" Ordner des aktuellen Projekts
+       Return {Stufe: {"seconds", "peak_mb"}}'''
+    # erst hier importieren, damit das Erzeugen der Chats ohne pandas auskommt
+    from analyzer import Analyzer
+    from chatmanager import ChatManager
+    from plotter import Plotter
+    from reporter import Reporter
+
+    results = {}
+    _, results["ingest"] = measure(
+        lambda: ChatManager(chatname, workers=workers, use_cache=False), memory)
+    _, results["ingest_cache_store"] = measure(
+        lambda: ChatManager(chatname, workers=workers, use_cache=True), False)
+    _, results["ingest_cache_load"] = measure(
+        lambda: ChatManager(chatname, workers=workers, use_cache=True), memory)
+    _, results["aggregates"] = measure(
+        lambda: ChatManager(chatname, workers=workers, use_cache=False).aggregates, memory)
+
+    analyzer = Analyzer(chatname, workers=workers, use_cache=False)
+    analyzer.manager.aggregates  # Zwischenergebnisse sind schon unter "aggregates" gemessen
+    for name, metric in _metrics(analyzer).items():
+        # jede Metrik ohne Zwischenergebnisse anderer Metriken messen
+        _, results[f"analyzer.{name}"] = measure(
+            lambda: (analyzer.clear_memo(), metric()), memory)
+
+    manager = analyzer.manager
+    plotter, results["plotter_frame"] = measure(
+        lambda: Plotter(manager.messages, manager.aggregates), memory)
+
+    if plots:
+        with tempfile.TemporaryDirectory() as plot_dir:
+            for name, plot in _plots(plotter, analyzer, plot_dir).items():
+                _, results[f"plotter.{name}"] = measure(plot, memory)
+
+    if report:
+        reporter = Reporter(chatname, workers=workers, use_cache=True)
+        with redirect_stdout(io.StringIO()):
+            _, results["report"] = measure(reporter.create_report, False)
+            _, results["report_interactive"] = measure(
+                lambda: reporter.create_report(interactive=True), False)
+            _, results["report_headless"] = measure(
+                lambda: reporter.create_report(plots=False), False)
+    return results
+
+
+def run(sizes: list, os_names: list, users: int = 5, workers: int = 1,
+        memory: bool = True, plots: bool = True, report: bool = True) -> dict:
+    '''Erzeugt Chats in einem temporären Projektordner und misst alle Stufen
+       Return {"meta": {...}, "results": {"<os>_<Nachrichten>": {Stufe: Messwerte}}}'''
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as project_dir:
+        # gleiche Ordnerstruktur wie im Projekt (chats, plots, reports, cache)
+        chat_dir = path.join(project_dir, "chats")
+        work_dir = path.join(project_dir, "WhatsAnalyzer")
+        os.makedirs(chat_dir)
+        os.makedirs(work_dir)
+        os.chdir(work_dir)
+        try:
+            for os_name in os_names:
+                for size in sizes:
+                    chatname = f"{os_name.lower()}_{size}"
+                    ChatGenerator(os_name, users=users).write(
+                        path.join(chat_dir, f"{chatname}.txt"), size)
+                    print(f"Messe {chatname} ...")
+                    results[chatname] = run_chat(chatname, workers, memory, plots, report)
+        finally:
+            os.chdir(cwd)
+
+    return {"meta": {"created": datetime.now().isoformat(timespec="seconds"),
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "cpu_count": os.cpu_count(),
+                     "parser_version": globals_.PARSER_VERSION,
+                     "users": users,
+                     "workers": workers},
+            "results": results}
+
+
+def compare(current: dict, baseline: dict) -> list:
+    '''Return [(Chat, Stufe, Sekunden Baseline, Sekunden jetzt, Verhältnis), ...]
+       für alle Stufen, die in beiden Messungen vorkommen (langsamste zuerst)'''
+    rows = []
+    for chat, stages in current["results"].items():
+        for stage, stats in stages.items():
+            old = baseline["results"].get(chat, {}).get(stage)
+            if old is None or old["seconds"] == 0:
+                continue
+            rows.append((chat, stage, old["seconds"], stats["seconds"],
+                         stats["seconds"] / old["seconds"]))
+    return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+if __name__ == "__main__":
+    project_basedir = path.dirname(path.dirname(path.realpath(__file__)))  # Projekt Root
+
+    parser = ArgumentParser("Benchmark aller Stufen mit erzeugten Chats")
+    parser.add_argument("-n", "--messages", type=int, nargs="+", default=[10000, 100000],
+                        help="Anzahl der Nachrichten pro Chat (mehrere möglich)")
+    parser.add_argument("--os", choices=["ios", "android"], nargs="+", default=["ios", "android"])
+    parser.add_argument("-u", "--users", type=int, default=5)
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Anzahl der Prozesse zum Einlesen (0 = alle Kerne)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Speicherspitzen nicht messen (halbiert die Laufzeit)")
+    parser.add_argument("--no-plots", action="store_true", help="Plots nicht messen")
+    parser.add_argument("--no-report", action="store_true", help="Reports nicht messen")
+    parser.add_argument("-o", "--output", type=str,
+                        default=path.join(project_basedir, "benchmarks", "benchmark.json"),
+                        help="JSON Datei für die Ergebnisse")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="JSON Datei einer früheren Messung (Baseline) zum Vergleichen")
+    args = parser.parse_args()
+
+    output = path.abspath(args.output)
+    baseline_path = path.abspath(args.compare) if args.compare else None
+    result = run(args.messages, [os_name.upper() for os_name in args.os], args.users,
+                 args.workers, not args.no_memory, not args.no_plots, not args.no_report)
+
+    os.makedirs(path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Ergebnisse gespeichert unter {output}")
+
+    for chat, stages in result["results"].items():
+        print(f"\n{chat}")
+        for stage, stats in stages.items():
+            memory = f"{stats['peak_mb']:9.1f} MB" if "peak_mb" in stats else ""
+            print(f"  {stage:45} {stats['seconds']:9.3f} s {memory}")
+
+    if baseline_path is not None:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nVergleich mit {baseline_path}")
+        for chat, stage, old, new, ratio in compare(result, baseline):
+            marker = "  <- langsamer" if ratio >= REGRESSION_RATIO else ""
+            print(f"  {chat:15} {stage:45} {old:9.3f} s -> {new:9.3f} s ({ratio:.2f}x){marker}")
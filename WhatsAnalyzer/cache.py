@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+import hashlib
+import json
+import os
+from os import path
+import pickle
+from urllib.parse import SplitResult
+
+from aggregates import ChatAggregates
+import globals_
+from message import Message
+from profiling import profiled
+from timestamps import EPOCH, to_seconds
+from vocabulary import Vocabulary
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# für Vorgänger-Exporte wird zuerst nur der Anfang der Datei verglichen
+HEAD_BYTES = 64 * 1024
+
+
+def file_hash(filepath: str, checkpoints: list = ()) -> tuple:
+    '''Return (SHA1 Hash des Dateiinhalts, {Position: SHA1 Hash der ersten Position Bytes})
+       checkpoints: Positionen, für die zusätzlich der Hash des Anfangs bestimmt wird'''
+    h = hashlib.sha1()
+    prefix_hashes = {}
+    pending = sorted(checkpoints)
+    pos = 0
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            while pending and pending[0] <= pos + len(block):
+                checkpoint = pending.pop(0)
+                prefix = h.copy()
+                prefix.update(block[:checkpoint - pos])
+                prefix_hashes[checkpoint] = prefix.hexdigest()
+            h.update(block)
+            pos += len(block)
+    return h.hexdigest(), prefix_hashes
+
+
+def _lock(f) -> None:
+    '''Wartet, bis die Datei f exklusiv für diesen Prozess gesperrt ist'''
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def head_hash(filepath: str, size: int = HEAD_BYTES) -> str:
+    '''Return SHA1 Hash der ersten size Bytes'''
+    with open(filepath, "rb") as f:
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+
+def _encode(values: list) -> tuple:
+    '''Return (Tabelle, Codes): jeder Wert wird nur einmal gespeichert'''
+    table = {}
+    codes = array("I", (table.setdefault(v, len(table)) for v in values))
+    return list(table), codes
+
+
+def _encode_words(messages: list) -> tuple:
+    '''Return (Wortliste, ids aller Worte, Anzahl Worte pro Nachricht (-1 für None))'''
+    vocabulary = Vocabulary()
+    word_ids = array("I")
+    word_lengths = array("i")
+    for msg in messages:
+        if msg.words is None:
+            word_lengths.append(-1)
+        else:
+            word_ids.extend(vocabulary.encode(msg.words))
+            word_lengths.append(len(msg.words))
+    return vocabulary.decode(range(len(vocabulary))), word_ids, word_lengths
+
+
+def _decode_words(columns: dict):
+    '''Gibt die Wortlisten der Nachrichten aus den Wort ids zurück'''
+    vocabulary = columns["vocabulary"]
+    word_ids = columns["word_ids"]
+    pos = 0
+    for length in columns["word_lengths"]:
+        if length < 0:
+            yield None
+        else:
+            yield [vocabulary[token_id] for token_id in word_ids[pos:pos + length]]
+            pos += length
+
+
+def to_columns(messages: list) -> dict:
+    '''Return die Nachrichten spaltenweise (Namen und Medien als Codes,
+       Worte als ids)'''
+    usernames, user_codes = _encode([msg.username for msg in messages])
+    mediatypes, media_codes = _encode([msg.mediatype for msg in messages])
+    vocabulary, word_ids, word_lengths = _encode_words(messages)
+    return {
+        "os": messages[0].os if messages else None,
+        "msg": [msg.msg for msg in messages],
+        "usernames": usernames,
+        "user_codes": user_codes,
+        "timestamps": array("q", (to_seconds(msg.dateandtime) for msg in messages)),
+        "body": [msg.body for msg in messages],
+        "mediatypes": mediatypes,
+        "media_codes": media_codes,
+        "vocabulary": vocabulary,
+        "word_ids": word_ids,
+        "word_lengths": word_lengths,
+        "emojis": [msg.emojis for msg in messages],
+        "links": [[tuple(url) for url in msg.links] for msg in messages],
+    }
+
+
+def from_columns(columns: dict) -> list:
+    '''Return Liste mit Message Objekten aus den Spalten'''
+    os_name = columns["os"]
+    usernames = columns["usernames"]
+    mediatypes = columns["mediatypes"]
+    return [Message.from_fields(msg, os_name, usernames[user_code],
+                                EPOCH + timedelta(seconds=timestamp), body,
+                                mediatypes[media_code], words=words,
+                                emojis=emojis,
+                                links=[SplitResult(*url) for url in links])
+            for msg, user_code, timestamp, body, media_code, words, emojis, links
+            in zip(columns["msg"], columns["user_codes"], columns["timestamps"],
+                   columns["body"], columns["media_codes"], _decode_words(columns),
+                   columns["emojis"], columns["links"])]
+
+
+def load_messages(columns_data: bytes) -> list:
+    '''Return Liste mit Message Objekten aus den gespeicherten Spalten eines
+       Cacheeintrags (entry["columns"])'''
+    return from_columns(pickle.loads(columns_data))
+
+
+class ParseCache:
+    '''Speichert geparste Chats im Cacheordner.
+       Einträge hängen vom Dateiinhalt (Hash) und der PARSER_VERSION ab.
+       Ob eine Datei neu gehasht werden muss, wird über Größe und
+       Änderungszeit entschieden (index.json).
+       Beginnt eine Datei mit dem kompletten Inhalt eines älteren Eintrags
+       (neuer Export desselben Chats), kann dieser über load_previous()
+       geladen und nur um das neue Ende ergänzt werden.'''
+
+    def __init__(self, cache_dir: str, max_bytes: int = globals_.CACHE_MAX_BYTES) -> None:
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._index_path = path.join(cache_dir, "index.json")
+        self._lock_path = path.join(cache_dir, "index.lock")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._files = {}  # Pfad -> Größe, Änderungszeit, Hash
+        self._entries = {}  # Hash -> Größe, Hash des Anfangs
+        self._read_index()
+        self._previous = {}  # Pfad -> Hash des Vorgänger-Exports
+
+    def _read_index(self) -> None:
+        '''Liest den aktuellen Stand von index.json (im Batch Modus schreiben
+           andere Prozesse zwischendurch ihre Einträge hinein)'''
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        self._files = index.get("files", {})
+        self._entries = index.get("entries", {})
+
+    @contextmanager
+    def _update_index(self):
+        '''Sperrt index.json für andere Prozesse, liest den aktuellen Stand neu ein
+           und speichert ihn mit den Änderungen aus dem with Block, damit parallele
+           Prozesse keine Einträge der anderen überschreiben'''
+        with open(self._lock_path, "a+b") as lock_file:
+            _lock(lock_file)
+            try:
+                self._read_index()
+                yield
+                self._save_index()
+            finally:
+                _unlock(lock_file)
+
+    def _save_index(self) -> None:
+        # eigener Dateiname pro Prozess, damit niemand eine halbe Datei liest
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self._files, "entries": self._entries}, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _entry_path(self, content_hash: str) -> str:
+        return path.join(self._cache_dir,
+                         f"{content_hash}_v{globals_.PARSER_VERSION}.pickle")
+
+    def _key(self, filepath: str) -> str:
+        '''Return den Inhaltshash der Datei. Neu gehasht wird nur,
+           wenn sich Größe oder Änderungszeit geändert haben'''
+        filepath = path.abspath(filepath)
+        stat = os.stat(filepath)
+        known = self._files.get(filepath)
+        if known is not None and known["size"] == stat.st_size \
+                and known["mtime"] == stat.st_mtime:
+            return known["hash"]
+
+        # Einträge, deren Inhalt der Anfang dieser Datei sein könnte
+        self._read_index()
+        head = head_hash(filepath)
+        candidates = {entry["size"]: entry_hash
+                      for entry_hash, entry in self._entries.items()
+                      if entry["size"] < stat.st_size
+                      and (entry["size"] <= HEAD_BYTES or entry["head"] == head)}
+        content_hash, prefix_hashes = file_hash(filepath, list(candidates))
+        matches = [size for size, prefix_hash in prefix_hashes.items()
+                   if candidates[size] == prefix_hash]
+        if matches:
+            self._previous[filepath] = candidates[max(matches)]
+
+        with self._update_index():
+            self._files[filepath] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                                     "hash": content_hash}
+            if known is not None and known["hash"] != content_hash \
+                    and known["hash"] != self._previous.get(filepath):
+                # Datei hat sich geändert -> veralteten Eintrag entfernen
+                self._remove(known["hash"])
+        return content_hash
+
+    def _remove(self, content_hash: str) -> None:
+        '''Entfernt einen Eintrag, falls keine andere Datei denselben Inhalt hat'''
+        if any(entry["hash"] == content_hash for entry in self._files.values()):
+            return
+        self._entries.pop(content_hash, None)
+        try:
+            os.remove(self._entry_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def _load_entry(self, content_hash: str) -> dict:
+        entry_path = self._entry_path(content_hash)
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+                # die Spalten nur einlesen, entpackt werden sie erst mit load_messages
+                columns_data = f.read()
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(entry_path)  # für die LRU Verdrängung als benutzt markieren
+        except FileNotFoundError:
+            pass  # inzwischen von einem anderen Prozess verdrängt
+        return {"size": entry["size"],
+                "columns": columns_data,
+                "aggregates": entry["aggregates"]}
+
+    @profiled
+    def load(self, filepath: str) -> dict:
+        '''Return {"size", "columns", "aggregates"} der Datei aus dem Cache oder None
+           (Message Objekte daraus mit load_messages(entry["columns"]))'''
+        return self._load_entry(self._key(filepath))
+
+    @profiled
+    def load_previous(self, filepath: str) -> dict:
+        '''Return den Eintrag eines älteren Exports, mit dessen Inhalt die Datei
+           beginnt ({"size", "columns", "aggregates"}), oder None'''
+        self._key(filepath)
+        previous_hash = self._previous.get(path.abspath(filepath))
+        if previous_hash is None:
+            return None
+        return self._load_entry(previous_hash)
+
+    @profiled
+    def store(self, filepath: str, messages: list, aggregates: ChatAggregates) -> None:
+        '''Speichert die Message Objekte (spaltenweise) und Zwischenergebnisse einer Datei im Cache'''
+        content_hash = self._key(filepath)
+        entry_path = self._entry_path(content_hash)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        size = os.stat(filepath).st_size
+        with open(tmp_path, "wb") as f:
+            # zwei Pickles hintereinander, damit ein Treffer nur die
+            # Zwischenergebnisse entpacken muss (siehe _load_entry)
+            pickle.dump({"size": size, "aggregates": aggregates},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(to_columns(messages), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+        head = head_hash(filepath)
+        with self._update_index():
+            self._entries[content_hash] = {"size": size, "head": head}
+            # der Vorgänger-Export wird durch den neuen Eintrag ersetzt
+            previous_hash = self._previous.pop(path.abspath(filepath), None)
+            if previous_hash is not None:
+                self._remove(previous_hash)
+            self._evict()
+
+    def _evict(self) -> None:
+        '''Entfernt Einträge alter Parserversionen und danach die am längsten
+           nicht benutzten Einträge, bis der Cache unter max_bytes liegt
+           (nur innerhalb von _update_index aufrufen)'''
+        suffix = f"_v{globals_.PARSER_VERSION}.pickle"
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith(".pickle"):
+                continue
+            entry_path = path.join(self._cache_dir, name)
+            try:
+                if not name.endswith(suffix):
+                    os.remove(entry_path)
+                    continue
+                stat = os.stat(entry_path)
+            except FileNotFoundError:
+                # z.B. von einem Prozess mit anderer Parserversion entfernt
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            self._entries.pop(path.basename(entry_path).split("_v")[0], None)
+            total -= size
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+# Farben aller Diagramme (PNG Graphen und interaktiver Report)
+NICECOLORS = ["#577590", "#43aa8b", "#90be6d",
+              "#f9c74f", "#f8961e", "#f3722c", "#f94144"]
+
+
+def user_vs_number_data(d: dict, mode: str = "bar", label_func=None) -> dict:
+    '''Return {"values": {Nutzername: Wert}, "labels": [Label, ...]}
+       für ein Dictionary nach dem Muster {<User Objekt>: Wert (int)}
+       (nach Wert sortiert und gerundet, ohne pandas / matplotlib)'''
+    if mode not in ("bar", "pie"):
+        raise ValueError(f"Den Modus '{mode}' gibt es nicht.")
+
+    # nach Wert sortieren und runden, Nutzername als y-Wert
+    values = {user.username: round(value, 1) for user, value in sorted(
+        d.items(), key=lambda item: item[1], reverse=True)}
+
+    # Werte als Labels eventuell anpassen
+    if label_func is not None:
+        labels = list(map(label_func, values.values()))
+    else:
+        labels = list(values.values())
+    return {"values": values, "labels": labels}
@@ -1,96 +1,284 @@
 # -*- coding: utf-8 -*-
 
+from aggregates import ChatAggregates
+from cache import ParseCache, load_messages
 from message import Message
+from profiling import PROFILER, count, profiled, span
+from scanner import ChatScanner
 from user import User
 import globals_
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import re
 from os import path
 import os
-import sys
+import threading
+
+
+# unter dieser Anzahl an Nachrichten pro Prozess lohnt sich paralleles Parsen nicht
+MIN_CHUNK_MESSAGES = 5000
+
+
+def _parse_chunk(args: tuple) -> tuple:
+    '''Return (Message Objekte, ChatAggregates) eines Bytebereichs (läuft im Worker Prozess).
+       Die Zwischenergebnisse (Worte, Emojis, Links) sind der teure Teil und werden
+       deshalb auch im Worker berechnet, der Hauptprozess fügt sie nur zusammen.'''
+    filepath, os_name, start, end = args
+    with ChatScanner(filepath, os_name, start, end) as scanner:
+        message_objects = (Message(msg, os_name) for msg in scanner)
+        messages = [msg for msg in message_objects if msg.username is not None]
+    return messages, ChatAggregates().update(messages)
 
 
 class ChatManager():
-    def __init__(self, chatname: str, ) -> None:
+    def __init__(self, chatname: str, streaming: bool = False, workers: int = 1,
+                 use_cache: bool = True) -> None:
+        '''streaming: falls True werden die Nachrichten nicht eingelesen,
+                      sondern nur über iter_messages() bereitgestellt
+                      (messages, usernames und users sind dann None)
+           workers: Anzahl der Prozesse zum Parsen (0 = alle Kerne)
+           use_cache: falls True werden geparste Nachrichten im "cache" Ordner
+                      gespeichert und beim nächsten Mal von dort geladen'''
         self._chatname = chatname
+        self._streaming = streaming
+        self._workers = workers if workers > 0 else os.cpu_count()
+        self._use_cache = use_cache
+        self._version = 0  # wird bei jedem reload() erhöht
+        self._messages_lock = threading.Lock()  # der Server fragt aus mehreren Threads
+        self._init_data()
+
+    def _init_data(self) -> None:
         self._os = self._init_os()
-        self._messages = self._init_messages()
-        self._usernames = self._init_usernames()
-        self._users = self._init_users()
+        self._aggregates = None
+        self._columns = None  # gespeicherte Spalten aus dem Cache, bis messages gebraucht wird
+        self._rows = None  # Nutzername -> Nachrichten (siehe _user_rows)
+        if self._streaming:
+            self._messages = None
+            self._usernames = None
+            self._users = None
+        else:
+            self._messages = self._init_messages()
+            self._usernames = self._init_usernames()
+            self._users = self._init_users()
+
+    def reload(self) -> None:
+        '''Liest die Chatdatei neu ein (z.B. nach einem neuen Export desselben Chats).
+           Mit Cache wird dabei nur das neue Ende geparst.'''
+        self._init_data()
+        self._version += 1
 
     @property
     def os(self) -> str:
         return self._os
 
+    @property
+    def version(self) -> int:
+        '''Return Zähler, der sich ändert, sobald die Nachrichten neu eingelesen wurden'''
+        return self._version
+
+    @property
+    def streaming(self) -> bool:
+        return self._streaming
+
+    @property
+    def aggregates(self) -> ChatAggregates:
+        '''Return Zwischenergebnisse (Anzahl, Worte, Emojis, Medien, Links) aller Nachrichten'''
+        if self._aggregates is None and self._messages is not None:
+            with span("ChatAggregates.update"):
+                self._aggregates = ChatAggregates().update(self._messages)
+        return self._aggregates
+
     @property
     def users(self) -> list:
         return self._users
 
     @property
     def messages(self) -> list:
+        '''Return Liste mit allen Message Objekten. Nach einem Cachetreffer werden sie
+           erst beim ersten Zugriff aus den Spalten gebaut, die Metriken kommen mit
+           den Zwischenergebnissen (aggregates) aus'''
+        if self._columns is not None:
+            with self._messages_lock:
+                if self._columns is not None:
+                    with span("load_messages"):
+                        self._messages = load_messages(self._columns)
+                    self._columns = None
         return self._messages
 
     @property
     def usernames(self) -> list:
         return self._usernames
 
-    def _read_chat(self) -> list:
-        '''Return alle Zeilen der Chatdatei als Liste
-           remove_multiliners: wenn True werden Zeilen, die nicht mit Datumstempel starten entfernt'''
+    def _chat_path(self) -> str:
+        '''Return den Pfad zur Chatdatei im "chats" Ordner
+           (oder den Pfad selbst, falls chatname direkt auf eine Datei zeigt)'''
+        if path.isfile(self._chatname):
+            return self._chatname
 
         # falls nur der Dateiname ohne ".txt" angegeben wurde, füge es hinzu
         if not self._chatname.endswith(".txt"):
             self._chatname += ".txt"
 
-        try:
-            project_basedir = path.dirname(os.getcwd())  # Projekt Root
-            filepath = f"{project_basedir}/chats/{self._chatname}"
-            with open(filepath, "r", encoding="utf-8") as f:
-                # Inhalt der Chatdatei lesen, LTR Mark entfernen, erste Line (WA Info) entfernen
-                content = f.read().replace(u"\u200e", "").splitlines()[1:]
-            return content
-        except FileNotFoundError:
-            print(f"Die Datei {filepath} wurde nicht gefunden.\nSchau nach, ob sich die Datei wirklich im 'chats' Ordner befindet und ob du den Namen richtig geschrieben hast.")
-            print("Aktuelles Verzeichnis:", os.getcwd())
-            sys.exit()
-
-    def _init_messages(self):
-        content = self._read_chat()
-        message_strings = []
-
-        # Nachrichten zusammenfügen, die über mehrere Zeilen gehen
-        date_pattern = getattr(globals_, f"DATEPATTERN_{self.os}")
-        for line in content:
-            if re.match(date_pattern, line) is not None:
-                message_strings.append(line)
+        project_basedir = path.dirname(os.getcwd())  # Projekt Root
+        filepath = f"{project_basedir}/chats/{self._chatname}"
+        if not path.isfile(filepath):
+            raise FileNotFoundError(
+                f"Die Datei {filepath} wurde nicht gefunden.\nSchau nach, ob sich die Datei wirklich im 'chats' Ordner befindet und ob du den Namen richtig geschrieben hast.\nAktuelles Verzeichnis: {os.getcwd()}")
+        return filepath
+
+    def _iter_lines(self):
+        '''Liest die Chatdatei Zeile für Zeile (ohne LTR Mark und ohne erste Zeile mit WA Info)'''
+        with open(self._chat_path(), "r", encoding="utf-8") as f:
+            lines = (line for raw in f
+                     for line in raw.replace(u"\u200e", "").splitlines())
+            next(lines, None)  # erste Line (WA Info) überspringen
+            yield from lines
+
+    def iter_messages(self):
+        '''Liest die Chatdatei schrittweise und gibt Message Objekte einzeln zurück.
+           Es wird immer nur die aktuelle Nachricht im Speicher gehalten.'''
+        date_regex = re.compile(getattr(globals_, f"DATEPATTERN_{self.os}"))
+        current = None
+        parsed = dropped = joined = 0
+
+        for line in self._iter_lines():
+            if date_regex.match(line) is not None:
+                if current is not None:
+                    msg = Message(current, self.os)
+                    parsed += 1
+                    if msg.username is not None:
+                        yield msg
+                    else:
+                        dropped += 1
+                current = line
+            elif current is not None:
+                # Nachrichten zusammenfügen, die über mehrere Zeilen gehen
+                current += f" {line}"
+                joined += 1
+
+        if current is not None:
+            msg = Message(current, self.os)
+            parsed += 1
+            if msg.username is not None:
+                yield msg
             else:
-                message_strings[-1] += f" {line}"
+                dropped += 1
+
+        count("messages_parsed", parsed)
+        count("continuation_lines_joined", joined)
+        count("messages_dropped_no_username", dropped)
+
+    @profiled
+    def _init_messages(self) -> list:
+        '''Return Liste mit allen Message Objekten
+           (fehlgeschlagene Messages werden rausgefiltert),
+           None bei einem Cachetreffer (dann baut messages sie bei Bedarf)'''
+        if not self._use_cache:
+            messages, self._aggregates = self._parse_messages()
+            return messages
 
-        # Message Objekte erstellen und fehlgeschlagene Messages rausfiltern
-        message_objects = [Message(msg, self.os)
-                           for msg in message_strings]
-        message_objects = [msg for msg in message_objects
-                           if msg.username is not None]
+        project_basedir = path.dirname(os.getcwd())  # Projekt Root
+        cache = ParseCache(f"{project_basedir}/cache")
+        filepath = self._chat_path()
+        entry = cache.load(filepath)
+        if entry is not None:
+            count("cache_hits")
+            self._aggregates = entry["aggregates"]
+            self._columns = entry["columns"]
+            return None  # erst bei Bedarf, siehe messages
+        count("cache_misses")
 
-        return message_objects
+        messages = None
+        previous = cache.load_previous(filepath)
+        if previous is not None:
+            # neuer Export desselben Chats -> nur das neue Ende parsen
+            new_messages, new_aggregates = self._parse_messages(start=previous["size"])
+            if new_messages is not None:
+                count("cache_incremental")
+                messages = load_messages(previous["columns"]) + new_messages
+                if new_aggregates is not None:
+                    with span("ChatAggregates.merge"):
+                        self._aggregates = previous["aggregates"].merge(new_aggregates)
+                else:
+                    with span("ChatAggregates.update"):
+                        self._aggregates = previous["aggregates"].update(new_messages)
+
+        if messages is None:
+            messages, self._aggregates = self._parse_messages()
+            if self._aggregates is None:
+                with span("ChatAggregates.update"):
+                    self._aggregates = ChatAggregates().update(messages)
+        cache.store(filepath, messages, self._aggregates)
+        return messages
+
+    @profiled
+    def _parse_messages(self, start: int = None) -> tuple:
+        '''Return (Liste mit allen Message Objekten direkt aus der Chatdatei, ChatAggregates)
+           Die ChatAggregates gibt es nur beim parallelen Parsen, sonst None
+           (sie werden dann bei Bedarf im Hauptprozess berechnet)
+           start: falls angegeben, werden nur die Nachrichten ab diesem Byte gelesen
+                  ((None, None), falls dort keine neue Nachricht beginnt)'''
+        # Datei mappen und nur die Nachrichtengrenzen bestimmen,
+        # Datei und Mapping bleiben nur während des Parsens offen
+        filepath = self._chat_path()
+        with span("ChatScanner"):
+            scanner = ChatScanner(filepath, self.os, start)
+        with scanner:
+            if start is not None and not scanner.starts_cleanly():
+                return None, None
+
+            workers = min(self._workers, len(scanner) // MIN_CHUNK_MESSAGES)
+            aggregates = None
+            with span("Message"):
+                if workers <= 1:
+                    message_objects = (Message(msg, self.os) for msg in scanner)
+                    messages = [msg for msg in message_objects if msg.username is not None]
+                else:
+                    # Datei in Bytebereiche aufteilen und parallel parsen,
+                    # map() behält die ursprüngliche Reihenfolge bei
+                    chunks = [(filepath, self.os, start, end)
+                              for start, end in scanner.chunk_spans(workers)]
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        results = list(executor.map(_parse_chunk, chunks))
+                    messages = [msg for chunk_messages, _ in results for msg in chunk_messages]
+            if workers > 1:
+                with span("ChatAggregates.merge"):
+                    aggregates = results[0][1]
+                    for _, chunk_aggregates in results[1:]:
+                        aggregates.merge(chunk_aggregates)
+
+            count("messages_parsed", len(scanner))
+            count("messages_dropped_no_username", len(scanner) - len(messages))
+            if PROFILER.enabled:
+                count("continuation_lines_joined", scanner.line_count() - len(scanner))
+        return messages, aggregates
 
     def _init_usernames(self) -> list:
         '''Return Liste mit allen individuellen Nutzernamen im Chat'''
-        allnames = set([msg.username for msg in self._messages])
-        return list(allnames)
+        # aus den Zwischenergebnissen, damit die Nachrichten nicht gebraucht werden
+        return list(self.aggregates.usernames)
 
+    @profiled
     def _init_users(self) -> list:
-        '''Return Liste mit User Objekten aller Nutzer'''
-        userlist = []
-        for current_username in self._usernames:
-            userrows = [msg for msg in self.messages
-                        if msg.username == current_username]
-            userlist.append(User(current_username, userrows))
-
+        '''Return Liste mit User Objekten aller Nutzer
+           (userrows werden erst beim ersten Zugriff bestimmt)'''
+        userlist = [User(username, partial(self._user_rows, username))
+                    for username in self._usernames]
         return sorted(userlist)
 
+    def _user_rows(self, username: str) -> list:
+        '''Return die Nachrichten eines Nutzers (beim ersten Aufruf werden
+           alle Nachrichten in einem Durchlauf nach Nutzer aufgeteilt)'''
+        if self._rows is None:
+            rows = {name: [] for name in self._usernames}
+            for msg in self.messages:
+                rows[msg.username].append(msg)
+            self._rows = rows
+        return self._rows[username]
+
     def _init_os(self) -> str:
         '''Return Name des Betriebssystems ("ios" oder "android")'''
-        first_line = self._read_chat()[0]
+        first_line = next(self._iter_lines(), "")
 
         if re.match(globals_.DATEPATTERN_IOS, first_line) is not None:
             return "IOS"
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from functools import lru_cache
+import re
+
+import emoji
+
+# Variation Selector 16 ("als Emoji darstellen") wird beim Suchen ignoriert,
+# damit z.B. "❤" und "❤️" als dasselbe Emoji zählen
+VS16 = "\ufe0f"
+
+
+def _normalize(text: str) -> str:
+    return text.replace(VS16, "")
+
+
+@lru_cache(maxsize=None)
+def _emoji_table() -> tuple:
+    '''Return ({Emoji (ohne VS16): ":name:"}, {Emoji (ohne VS16): Emoji zur Anzeige})
+       aus der Tabelle des emoji Pakets. Angezeigt wird die Schreibweise aus der
+       Tabelle, gibt es mehrere, die vollständig qualifizierte (die mit den meisten VS16)'''
+    try:
+        # emoji >= 1.7
+        table = {e: data["en"] for e, data in emoji.EMOJI_DATA.items()}
+    except AttributeError:
+        table = emoji.UNICODE_EMOJI_ENGLISH
+
+    names = {}
+    display = {}
+    for emj, name in table.items():
+        key = _normalize(emj)
+        names.setdefault(key, name)
+        if len(emj) > len(display.get(key, "")):
+            display[key] = emj
+    return names, display
+
+
+def emoji_names() -> dict:
+    '''Return {Emoji (ohne VS16): ":name:"} aus der Tabelle des emoji Pakets'''
+    return _emoji_table()[0]
+
+
+@lru_cache(maxsize=None)
+def _candidate_regex():
+    '''Return einmalig kompilierte Regex für zusammenhängende Zeichen, die in
+       Emojis vorkommen (normaler Text wird damit in einem Schritt übersprungen)'''
+    codepoints = sorted(set(map(ord, "".join(emoji_names()))))
+    # aufeinanderfolgende Codepoints zu Bereichen zusammenfassen,
+    # eine lange Liste einzelner Zeichen macht die Zeichenklasse sehr langsam
+    ranges = []
+    for cp in codepoints:
+        if ranges and ranges[-1][1] == cp - 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    charset = "".join(f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges)
+    return re.compile(f"[{charset}]+")
+
+
+@lru_cache(maxsize=None)
+def _max_length() -> int:
+    return max(len(emj) for emj in emoji_names())
+
+
+def extract_emojis(text: str) -> list:
+    '''Return Liste aller Emojis im Text (als Zeichen in der Schreibweise des
+       emoji Pakets, egal ob im Text mit oder ohne VS16).
+       Es wird immer das längste passende Emoji genommen, damit Sequenzen
+       wie Familien, Flaggen oder Hautfarben ganz erkannt werden'''
+    display = _emoji_table()[1]
+    max_length = _max_length()
+    found = []
+    for run in _candidate_regex().findall(_normalize(text)):
+        i = 0
+        while i < len(run):
+            for length in range(min(max_length, len(run) - i), 0, -1):
+                emj = display.get(run[i:i + length])
+                if emj is not None:
+                    found.append(emj)
+                    i += length
+                    break
+            else:
+                i += 1
+    return found
+
+
+def count_emojis(texts) -> Counter:
+    '''Return Counter der Emojis in mehreren Texten (ein Regex Durchlauf für alle)'''
+    return Counter(extract_emojis("\n".join(texts)))
+
+
+def emoji_text(emj: str) -> str:
+    '''Return Name des Emojis mit Doppelpunkten (z.B. ":red_heart:"), mit oder ohne VS16'''
+    return emoji_names().get(_normalize(emj), emj)
+
+
+def emoji_name(emj: str) -> str:
+    '''Return Name des Emojis ohne Doppelpunkte (z.B. "red_heart")'''
+    return emoji_text(emj).strip(":")
@@ -11,6 +11,10 @@ MSG_PATTERN = (r"^(?P<prefix>(?P<dateandtime>(?:\[)?\d\d\.\d\d\.\d\d,\s\d\d:\d\d
                r"(?:(?:<?|[^\w\d])(?P<media>\w+)\s(?:ausgeschlossen|weggelassen)>?$)?"  # media
                r"(?P<body>.*)")  # body
 
+# Cache für geparste Chats (Version erhöhen, wenn sich das Parsen ändert)
+PARSER_VERSION = 11
+CACHE_MAX_BYTES = 1024 ** 3  # 1 GB
+
 
 # https://github.com/PetengDedet/WhatsApp-Analyzer/blob/master/stop-words/german.txt
 # https://www.pc-erfahrung.de/nebenrubriken/sonstiges/webdesignwebentwicklung/stoppwortliste.html
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+
+
+class SpaceSaving:
+    '''Ungefähre Häufigkeiten der häufigsten Elemente eines Datenstroms mit festem
+       Speicher (Space-Saving, Metwally et al. 2005).
+       Gezählt werden höchstens capacity Elemente. Ist kein Platz mehr frei, übernimmt
+       ein neues Element den Platz des seltensten und erbt dessen Anzahl als Fehler.
+
+       Garantien bei total gezählten Elementen:
+       - Anzahl - error(x) <= wahre Anzahl von x <= Anzahl
+       - error(x) <= max_error <= total / capacity
+       - jedes Element, das öfter als total / capacity vorkommt, ist enthalten'''
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError(
+                f"Die Kapazität {capacity} ist zu klein. Versuch es mal mit einer Zahl ab 1")
+        self._capacity = capacity
+        self._counts = {}  # Element -> geschätzte Anzahl
+        self._errors = {}  # Element -> Anzahl, die es beim Einzug geerbt hat
+        # Anzahl -> Elemente mit genau dieser Anzahl (dict als geordnete Menge),
+        # damit das seltenste Element ohne Suche gefunden wird
+        self._buckets = {}
+        self._min = 0
+        self._total = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def total(self) -> int:
+        '''Return Anzahl aller gezählten Elemente (auch der verdrängten)'''
+        return self._total
+
+    @property
+    def max_error(self) -> int:
+        '''Return die größtmögliche Überschätzung einer Anzahl (0, solange nichts verdrängt wurde)'''
+        return self._min if len(self._counts) == self._capacity else 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, item) -> bool:
+        return item in self._counts
+
+    def add(self, item) -> None:
+        '''Zählt ein Vorkommen von item'''
+        self._total += 1
+        count = self._counts.get(item)
+        if count is not None:
+            self._remove_from_bucket(item, count)
+        elif len(self._counts) < self._capacity:
+            count = 0
+            self._errors[item] = 0
+            self._min = 0
+        else:
+            # das am längsten seltenste Element verdrängen
+            count = self._min
+            bucket = self._buckets[count]
+            victim = next(iter(bucket))
+            self._remove_from_bucket(victim, count)
+            del self._counts[victim]
+            del self._errors[victim]
+            self._errors[item] = count
+        self._counts[item] = count + 1
+        self._buckets.setdefault(count + 1, {})[item] = None
+        if self._min == count:
+            self._min = count + 1 if count not in self._buckets else count
+
+    def _remove_from_bucket(self, item, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[count]
+
+    def update(self, items) -> "SpaceSaving":
+        '''Zählt alle Elemente aus items (wie Counter.update)'''
+        for item in items:
+            self.add(item)
+        return self
+
+    def error(self, item) -> int:
+        '''Return um wie viel die Anzahl von item höchstens zu hoch ist'''
+        return self._errors.get(item, 0)
+
+    def most_common(self, n: int = None) -> list:
+        '''Return die n häufigsten Elemente [(Element, geschätzte Anzahl), ...]
+           (n = None: alle gezählten Elemente)'''
+        if n is None:
+            return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(n, self._counts.items(), key=lambda item: item[1])
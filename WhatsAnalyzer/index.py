@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+
+import numpy as np
+
+
+class InvertedIndex:
+    '''Ordnet jedem Wort die (aufsteigend sortierten) Nummern der Nachrichten zu,
+       in denen es vorkommt. Die Nummer ist die Position in ChatManager.messages.'''
+
+    def __init__(self) -> None:
+        self._postings = {}  # Wort -> Array mit Nachrichtennummern
+
+    def add(self, msg_id: int, words: list) -> None:
+        '''Fügt eine Nachricht hinzu (msg_id muss größer als alle bisherigen sein)'''
+        for word in set(words):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("I")
+            postings.append(msg_id)
+
+    def merge(self, other: "InvertedIndex", offset: int) -> None:
+        '''Fügt die Nachrichten eines anderen Index an, deren Nummern um offset
+           verschoben werden (offset muss größer als alle bisherigen Nummern sein)'''
+        for word, other_postings in other._postings.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("I")
+            postings.frombytes((np.frombuffer(other_postings, dtype=np.uint32)
+                                + np.uint32(offset)).tobytes())
+
+    def lookup(self, term: str) -> np.ndarray:
+        '''Return sortierte Nummern aller Nachrichten mit dem Wort'''
+        postings = self._postings.get(term.lower())
+        if postings is None:
+            return np.empty(0, dtype=np.uint32)
+        return np.frombuffer(postings, dtype=np.uint32)
+
+    def query_all(self, terms: list) -> np.ndarray:
+        '''Return Nummern der Nachrichten, die alle Worte enthalten (UND)'''
+        # mit der kürzesten Liste anfangen, dann bleibt die Schnittmenge klein
+        postings = sorted((self.lookup(term) for term in terms), key=len)
+        if not postings:
+            return np.empty(0, dtype=np.uint32)
+        result = postings[0]
+        for other in postings[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def query_any(self, terms: list) -> np.ndarray:
+        '''Return Nummern der Nachrichten, die mindestens eins der Worte enthalten (ODER)'''
+        postings = [self.lookup(term) for term in terms]
+        if not postings:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(np.concatenate(postings))
+
+    def __contains__(self, term: str) -> bool:
+        return term.lower() in self._postings
+
+    def __len__(self) -> int:
+        return len(self._postings)
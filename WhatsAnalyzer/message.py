@@ -2,85 +2,117 @@
 
 import re
 from datetime import datetime
-import emoji
 from urllib.parse import urlsplit
+from emojis import emoji_text, extract_emojis
 import globals_
+from timestamps import parse_dateandtime
+
+# Muster einmalig kompilieren statt bei jeder Nachricht
+MSG_REGEX = re.compile(globals_.MSG_PATTERN)
+BLACKLIST_REGEX = re.compile(r"[^A-Za-zäöü\s]")
+LINK_REGEX = re.compile(r"https?://[^\s]+")
+
+
+# Stopwords als Menge für schnelles Nachschlagen, einmal für alle Nachrichten
+STOPWORDS = frozenset(globals_.STOPWORDS)
+
+
+def tokenize(text: str) -> list:
+    '''Return die Worte eines Textes wie in Message.words (nur Buchstaben,
+       klein geschrieben), z.B. auch für Suchanfragen an den InvertedIndex'''
+    charonly_text = BLACKLIST_REGEX.sub("", text)
+    return [w.lower() for w in charonly_text.split(" ")
+            if w != "" and w != " "]
+
+
+# Platzhalter für abgeleitete Felder, die noch nicht berechnet wurden
+_UNSET = object()
 
 
 class Message:
-    def __init__(self, msg: list, os: str) -> None:
+    # __slots__ statt __dict__: deutlich weniger Speicher pro Nachricht.
+    # Abgeleitete Felder (words, emojis, links...) werden erst beim
+    # ersten Zugriff berechnet und dann im Slot gespeichert
+    __slots__ = ("_msg", "_os", "_username", "_dateandtime", "_body", "_mediatype",
+                 "_words", "_words_without_stopwords", "_emojis", "_links")
+
+    def __init__(self, msg: str, os: str) -> None:
         self._msg = msg
         self._os = os
-        self._stopwords = globals_.STOPWORDS
-        self._username = self._init_username()
-        self._dateandtime = self._init_dateandtime()
-        self._body = self._init_body()
-        self._mediatype = self._init_mediatype()
-        self._words = self._init_words()
-        self._words_without_stopwords = self._init_words(
-            without_stopwords=True)
-        self._emojitexts = self._init_emojitexts()
-        self._links = self._init_links()
-
-    def _init_username(self) -> str:
-        # passende Variable für
-        match = re.match(globals_.MSG_PATTERN, self.msg)
+        # Zeile nur einmal matchen, alle Felder kommen aus demselben Match
+        match = MSG_REGEX.match(msg)
+        self._username = self._init_username(match)
+        self._dateandtime = self._init_dateandtime(match)
+        self._body = self._init_body(match)
+        self._mediatype = self._init_mediatype(match)
+
+    @classmethod
+    def from_fields(cls, msg: str, os: str, username: str, dateandtime: datetime,
+                    body: str, mediatype: str, words: list = _UNSET,
+                    words_without_stopwords: list = _UNSET, emojis: list = _UNSET,
+                    links: list = _UNSET) -> "Message":
+        '''Return Message aus bereits geparsten Feldern (z.B. aus dem Cache),
+           ohne die Zeile erneut zu parsen'''
+        self = cls.__new__(cls)
+        self._msg = msg
+        self._os = os
+        self._username = username
+        self._dateandtime = dateandtime
+        self._body = body
+        self._mediatype = mediatype
+        for name, value in (("_words", words),
+                            ("_words_without_stopwords", words_without_stopwords),
+                            ("_emojis", emojis), ("_links", links)):
+            if value is not _UNSET:
+                setattr(self, name, value)
+        return self
+
+    def _init_username(self, match) -> str:
         if match is not None:
             return match.group("username")
         else:
             return None
 
-    def _init_dateandtime(self) -> datetime:
-        dateparse_pattern = getattr(globals_, f"DATEPARSE_{self.os}")
-
-        date_match = re.match(globals_.MSG_PATTERN, self.msg)
-        if date_match is not None:
-            return datetime.strptime(date_match.group("dateandtime"), dateparse_pattern)
+    def _init_dateandtime(self, match) -> datetime:
+        if match is not None:
+            return parse_dateandtime(match.group("dateandtime"), self.os)
         else:
             return None
 
-    def _init_mediatype(self) -> str:
-        media_match = re.match(globals_.MSG_PATTERN, self.msg)
-        if media_match is not None:
-            return media_match.group("media")
+    def _init_mediatype(self, match) -> str:
+        if match is not None:
+            return match.group("media")
         else:
             return None
 
-    def _init_body(self) -> str:
-        match = re.match(globals_.MSG_PATTERN, self.msg)
+    def _init_body(self, match) -> str:
         if match is not None:
             return match.group("body")
         else:
             return None
 
-    def _init_words(self, without_stopwords=False) -> list:
+    def _init_words(self) -> list:
         if self.mediatype is None and self.username is not None:
-            blacklist_pattern = r"[^A-Za-zäöü\s]"
-            charonly_msg = re.sub(blacklist_pattern, "", self.body)
-            if without_stopwords:
-                return [w.lower() for w in charonly_msg.split(" ")
-                        if w != "" and w != " " and w.lower() not in self.stopwords]
-            else:
-                return [w.lower() for w in charonly_msg.split(" ")
-                        if w != "" and w != " "]
+            return tokenize(self.body)
+        else:
+            return None
+
+    def _init_words_without_stopwords(self) -> list:
+        # aus den bereits zerlegten Worten ableiten statt neu zu zerlegen
+        if self.words is not None:
+            return [w for w in self.words if w not in STOPWORDS]
         else:
             return None
 
-    def _init_emojitexts(self):
+    def _init_emojis(self) -> list:
         if self.body is not None:
-            strange_pattern = r"[a-zA-Z0-9\.,:!?\s]"
-            strange_signs_only = re.sub(strange_pattern, "", self.body)
-            demojized = emoji.demojize(strange_signs_only)
-            emoji_pattern = r":[a-z_]+:"
-            emojitexts = re.findall(emoji_pattern, demojized)
-            if len(emojitexts) > 0:
-                return emojitexts
+            return extract_emojis(self.body)
         else:
             return None
 
     def _init_links(self) -> list:
         if self.body is not None:
-            matches = re.findall("https?://[^\s]+", self.body)
+            matches = LINK_REGEX.findall(self.body)
             return [urlsplit(url) for url in matches]
         else:
             return None
@@ -105,13 +137,21 @@ class Message:
     @property
     def words(self) -> list:
         '''Return Liste mit allen Wörtern der Nachricht falls vorhanden, sonst None'''
-        return self._words
+        try:
+            return self._words
+        except AttributeError:
+            self._words = self._init_words()
+            return self._words
 
     @property
     def words_without_stopwords(self) -> list:
         '''Return Liste mit allen Wörtern der Nachricht (stopwords ausgenommen) falls vorhanden,
            sonst None'''
-        return self._words_without_stopwords
+        try:
+            return self._words_without_stopwords
+        except AttributeError:
+            self._words_without_stopwords = self._init_words_without_stopwords()
+            return self._words_without_stopwords
 
     @property
     def mediatype(self) -> str:
@@ -125,8 +165,23 @@ class Message:
         return self._msg
 
     @property
-    def emojitexts(self):
-        return self._emojitexts
+    def emojis(self) -> list:
+        '''Return Liste mit allen Emojis der Nachricht (als Zeichen) falls vorhanden,
+           sonst None'''
+        try:
+            return self._emojis
+        except AttributeError:
+            self._emojis = self._init_emojis()
+            return self._emojis
+
+    @property
+    def emojitexts(self) -> list:
+        '''Return Liste mit den Namen aller Emojis (z.B. ":red_heart:") falls vorhanden,
+           sonst None'''
+        if self.emojis:
+            return [emoji_text(emj) for emj in self.emojis]
+        else:
+            return None
 
     @property
     def os(self) -> str:
@@ -135,14 +190,21 @@ class Message:
 
     @property
     def stopwords(self) -> set:
-        '''Return Liste mit Worten, die beim Wortzählen ignoriert werden'''
-        return self._stopwords
+        '''Return Menge mit Worten, die beim Wortzählen ignoriert werden'''
+        return STOPWORDS
 
     @property
     def links(self) -> list:
         '''Return Liste mit Link objecten aus der Nachricht'''
-        return self._links
+        try:
+            return self._links
+        except AttributeError:
+            self._links = self._init_links()
+            return self._links
 
     @property
-    def dictionary(self):
-        return self.__dict__
+    def dictionary(self) -> dict:
+        '''Return die geparsten Grundfelder als Dictionary
+           (abgeleitete Felder wie words werden nicht berechnet)'''
+        return {name: getattr(self, name) for name in
+                ("_msg", "_os", "_username", "_dateandtime", "_body", "_mediatype")}
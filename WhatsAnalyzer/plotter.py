@@ -1,91 +1,122 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import seaborn as sns
 from scipy.ndimage.filters import gaussian_filter1d
 
+from aggregates import ChatAggregates
+import chartdata
+from profiling import profiled
+from query import MessageIndex
+import render
+from timeline import WEEKDAY_NAMES
+
 
 class Plotter:
-    def __init__(self, messages) -> None:
+    # Spalten, die nur bei Bedarf angelegt werden (siehe add_columns)
+    HEAVY_COLUMNS = ("_msg", "_body", "_words", "_emojis", "_links")
+
+    def __init__(self, messages, aggregates: ChatAggregates = None,
+                 index: MessageIndex = None) -> None:
+        '''messages: Liste der Message Objekte oder Funktion, die sie liefert
+                     (wird erst aufgerufen, wenn sie gebraucht werden)
+           aggregates: Zwischenergebnisse der Nachrichten (z.B. ChatManager.aggregates),
+                       falls None werden sie aus messages berechnet
+           index: MessageIndex der Zwischenergebnisse (z.B. Analyzer.message_index),
+                  falls None wird er beim ersten Filter gebaut'''
         sns.despine(left=True, bottom=True)
         self._messages = messages
+        self._aggregates = aggregates if aggregates is not None \
+            else ChatAggregates().update(self.messages)
+        self._index = index
         self._df = self._init_dataframe()
-        self._nicecolors = ["#577590", "#43aa8b", "#90be6d",
-                            "#f9c74f", "#f8961e", "#f3722c", "#f94144"]
+        self._nicecolors = render.NICECOLORS
         self.prettify()
 
+    @profiled
     def _init_dataframe(self) -> pd.DataFrame:
-        messages = self._messages
-        message_dicts = [msg.dictionary for msg in messages]
-        df = pd.DataFrame(message_dicts)
-        return df
+        '''Return DataFrame mit typisierten Spalten direkt aus den Arrays der
+           Zwischenergebnisse (Zeitstempel als datetime64, Nutzer und Medien als category)'''
+        aggregates = self._aggregates
+        return pd.DataFrame({
+            "_dateandtime": pd.to_datetime(aggregates.timestamps, unit="s"),
+            "_username": pd.Categorical.from_codes(aggregates.user_codes.astype(np.int32),
+                                                   categories=aggregates.usernames),
+            "_mediatype": pd.Categorical.from_codes(aggregates.media_codes,
+                                                    categories=aggregates.mediatypes),
+            "_word_count": aggregates.msg_word_counts,
+        })
+
+    @profiled
+    def add_columns(self, *columns: str) -> pd.DataFrame:
+        '''Ergänzt das DataFrame um Spalten aus HEAVY_COLUMNS (z.B. "_body")
+           Return das DataFrame'''
+        for column in columns:
+            if column not in self.HEAVY_COLUMNS:
+                raise ValueError(
+                    f"Die Spalte '{column}' gibt es nicht. Versuch es mal mit {', '.join(self.HEAVY_COLUMNS)}")
+            if column not in self._df:
+                attribute = column.lstrip("_")
+                self._df[column] = [getattr(msg, attribute) for msg in self.messages]
+        return self._df
+
+    @property
+    def messages(self) -> list:
+        '''Return alle Message Objekte (erst hier geladen, falls eine Funktion übergeben wurde)'''
+        if callable(self._messages):
+            self._messages = self._messages()
+        return self._messages
 
     @property
     def df(self) -> pd.DataFrame:
         '''Return das Haupt DataFrame mit allen Nachrichten'''
         return self._df
 
+    @property
+    def message_index(self) -> MessageIndex:
+        '''Return den MessageIndex für Zeitfenster und Nutzerfilter'''
+        if self._index is None:
+            self._index = MessageIndex(self._aggregates)
+        return self._index
+
+    def _frame(self, since=None, until=None, users=None) -> pd.DataFrame:
+        '''Return die Zeilen des DataFrames von since (inklusive) bis until (exklusive)
+           der Nutzer users (ohne Filter das DataFrame selbst)'''
+        if since is None and until is None and users is None:
+            return self.df
+        return self.df.iloc[self.message_index.select(since, until, users).positions]
+
     def prettify(self) -> None:
         '''Verschönert die Matplotlib Darstellung'''
-        sns.set(font="Franklin Gothic Book",
-                rc={"axes.axisbelow": False,
-                    "axes.edgecolor": "lightgrey",
-                    "axes.facecolor": "None",
-                    "axes.grid": False,
-                    "axes.labelcolor": "dimgrey",
-                    "axes.spines.right": False,
-                    "axes.spines.top": False,
-                    "figure.facecolor": "white",
-                    "lines.solid_capstyle": "round",
-                    "patch.edgecolor": "w",
-                    "patch.force_edgecolor": True,
-                    "text.color": "dimgrey",
-                    "xtick.bottom": False,
-                    "xtick.color": "dimgrey",
-                    "xtick.direction": "out",
-                    "xtick.top": False,
-                    "ytick.color": "dimgrey",
-                    "ytick.direction": "out",
-                    "ytick.left": False,
-                    "ytick.right": False})
+        render.apply_style()
 
     def gaussian_filter(self, lst: list, sigma: float = 1.5):
         return gaussian_filter1d(lst, sigma=sigma)
 
-    def plot_total_messages_over_time(self, export_path: str = None,
-                                      title: str = None,
-                                      show: bool = False):
-        '''Plots Nachrichten über Zeit (resample mode bestimmt Periode)
-           export_path: falls nicht None -> speichert den plot unter <export_path>
-           show: falls True: zeigt das Diagramma an'''
-
+    @profiled
+    def total_messages_over_time_data(self, since=None, until=None, users=None) -> pd.Series:
+        '''Return Anzahl der Nachrichten pro Woche
+           since / until / users: nur Nachrichten aus diesem Zeitraum / von diesen Nutzern'''
+        df = self._frame(since, until, users)
         # Gruppieren (resamplen) auf die festgelegte Periode
-        data = self.df.groupby(self.df._dateandtime.dt.date).size()
+        data = df.groupby(df._dateandtime.dt.date).size()
         data.index = pd.to_datetime(data.index)
-        data = data.resample("W").sum()
-        ax = data.plot(kind="bar", title=title)
-
-        # tick Formatierung
-        ticklabels = [""]*len(data.index)
-        ticklabels[::4] = [item.strftime('%b %d') for item in data.index[::4]]
-        ticklabels[::12] = [item.strftime('%b %d\n%Y')
-                            for item in data.index[::12]]
-        ax.xaxis.set_major_formatter(ticker.FixedFormatter(ticklabels))
-        ax.set_xlabel("Zeit")
-        plt.gcf().autofmt_xdate()
+        return data.resample("W").sum()
 
-        self.plot(show=show, export_path=export_path)
-
-    def plot_user_messages_over_time(self, export_path=None, show=False, title=None):
-        '''Plot Entwicklung der Nachrichtenanzahl pro Nutzer über die Zeit'''
-        groups = self.df.groupby([pd.Grouper(key="_dateandtime", freq="W"), "_username"])[
-            "_username"].size()
+    @profiled
+    def user_messages_over_time_data(self, since=None, until=None, users=None) -> list:
+        '''Return geglättete Nachrichtenanzahl pro Woche für jeden Nutzer
+           Returntype: [(Label, x Werte, y Werte), ...] (meiste Nachrichten zuerst)
+           since / until / users: nur Nachrichten aus diesem Zeitraum / von diesen Nutzern'''
+        df = self._frame(since, until, users)
+        groups = df.groupby([pd.Grouper(key="_dateandtime", freq="W"), "_username"],
+                                 observed=True)["_username"].size()
 
         datadict = {}
         # Daten von jedem Nutzer bestimmen
-        for username in self.df["_username"].unique():
+        for username in df["_username"].unique():
             user_df = groups.xs(username, level=1, drop_level=False)
             x_data = list(user_df.index.get_level_values(0))
             y_data = self.gaussian_filter(list(user_df.values))
@@ -97,50 +128,72 @@ class Plotter:
         sorted_user_sums = dict(
             sorted(user_sums.items(), key=lambda item: item[1], reverse=True))
 
-        # Daten entpacken und plotten
-        for username in sorted_user_sums.keys():
-            user_data = datadict[username]
-            x_data = user_data[0]
-            y_data = user_data[1]
-            total_msg_count = user_sums[username]
-
-            plt.plot(x_data, y_data,
-                     label=f"{username} - ({total_msg_count} Total)")
+        return [(f"{username} - ({user_sums[username]} Total)", *datadict[username])
+                for username in sorted_user_sums.keys()]
 
-        plt.legend()
-        plt.gca().set_title(title)
-        self.plot(show=show, export_path=export_path)
-
-    def plot_group_messeges_by(self, by: str, export_path=None, show=False, title=None):
-        '''Plots Nachrichten Gruppiert nach "by"
+    @profiled
+    def group_messages_by_data(self, by: str, since=None, until=None, users=None) -> tuple:
+        '''Return (Anzahl der Nachrichten pro Gruppe, x-Label)
            by: Möglichkeiten ("hour", "weekday")
-           export_path: falls nicht None -> speichert den plot unter <export_path>
-           show: falls True: zeigt das Diagramma an'''
-
+           since / until / users: nur Nachrichten aus diesem Zeitraum / von diesen Nutzern'''
         if by == "hour":
-            data = self.df.groupby(self.df._dateandtime.dt.hour).size()
-            ax = data.plot.bar(title=title)
-            ax.set_xlabel("Stunde")
+            df = self._frame(since, until, users)
+            data = df.groupby(df._dateandtime.dt.hour).size()
+            return data, "Stunde"
 
         elif by == "weekday":
-            data = self.df.groupby(self.df._dateandtime.dt.weekday).size()
-
-            weekday_names = {0: "Montag", 1: "Dienstag", 2: "Mittwoch",
-                             3: "Donnerstag", 4: "Freitag", 5: "Samstag", 6: "Sonntag"}
-            data.index = [weekday_names.get(item, item) for item in data.index]
+            df = self._frame(since, until, users)
+            data = df.groupby(df._dateandtime.dt.weekday).size()
 
-            ax = data.plot.bar(title=title)
-            ax.set_xlabel("Wochentag")
+            data.index = [WEEKDAY_NAMES[item] for item in data.index]
+            return data, "Wochentag"
 
         else:
             raise ValueError(
                 f"Den Modus '{by}' gibt es nicht. Versuch es mal mit 'hour' oder 'weekday'")
 
-        # x-Label rotieren
-        ax = plt.gca()
-        plt.setp(ax.get_xticklabels(), rotation=30,
-                 horizontalalignment='right')
+    @profiled
+    def user_vs_number_data(self, d: dict, mode: str = "bar", label_func=None) -> dict:
+        '''Return {"values": {Nutzername: Wert}, "labels": [Label, ...]}
+           für ein Dictionary nach dem Muster {<User Objekt>: Wert (int)}
+           (nach Wert sortiert und gerundet)'''
+        return chartdata.user_vs_number_data(d, mode, label_func)
+
+    @profiled
+    def reply_matrix_data(self, d: dict) -> pd.DataFrame:
+        '''Return DataFrame [Antwortender, Angeschriebener]
+           für ein Dictionary nach dem Muster {<Antwortender>: {<Angeschriebener>: Wert}}'''
+        return pd.DataFrame({replier.username: {replied_to.username: value
+                                                for replied_to, value in row.items()}
+                             for replier, row in d.items()}).T
+
+    def plot_total_messages_over_time(self, export_path: str = None,
+                                      title: str = None,
+                                      show: bool = False,
+                                      since=None, until=None, users=None):
+        '''Plots Nachrichten über Zeit (resample mode bestimmt Periode)
+           export_path: falls nicht None -> speichert den plot unter <export_path>
+           show: falls True: zeigt das Diagramma an
+           since / until / users: wie bei total_messages_over_time_data'''
+        render.draw_weekly_bars(plt.gca(),
+                                self.total_messages_over_time_data(since, until, users), title)
+        self.plot(show=show, export_path=export_path)
+
+    def plot_user_messages_over_time(self, export_path=None, show=False, title=None,
+                                     since=None, until=None, users=None):
+        '''Plot Entwicklung der Nachrichtenanzahl pro Nutzer über die Zeit'''
+        render.draw_user_lines(plt.gca(),
+                               self.user_messages_over_time_data(since, until, users), title)
+        self.plot(show=show, export_path=export_path)
 
+    def plot_group_messeges_by(self, by: str, export_path=None, show=False, title=None,
+                               since=None, until=None, users=None):
+        '''Plots Nachrichten Gruppiert nach "by"
+           by: Möglichkeiten ("hour", "weekday")
+           export_path: falls nicht None -> speichert den plot unter <export_path>
+           show: falls True: zeigt das Diagramma an
+           since / until / users: nur Nachrichten aus diesem Zeitraum / von diesen Nutzern'''
+        render.draw_grouped_bars(plt.gca(), self.group_messages_by_data(by, since, until, users), title)
         self.plot(show=show, export_path=export_path)
 
     def plot_user_vs_number_dict(self, d: dict, mode: str = "bar",
@@ -153,73 +206,28 @@ class Plotter:
            label_func: Funktion, die auf die Werte angewendet wird, bevor sie zu Labels werden
            export_path: falls nicht None -> speichert den plot unter <export_path>
            show: falls True: zeigt das Diagramma an'''
+        data = self.user_vs_number_data(d, mode, label_func)
+        render.DRAW[mode](plt.gca(), data, title)
+        self.plot(show=show, export_path=export_path)
 
-        def sorted_dict(to_sort: dict, reverse=False, round_numbers=True):
-            # nach Wert sortieren
-            sorted_dict = {k: v for k, v in sorted(
-                to_sort.items(), key=lambda item: item[1], reverse=reverse)}
-
-            # Werte runden
-            if round_numbers:
-                sorted_dict = {user: round(value, 1)
-                               for user, value in sorted_dict.items()}
-
-            # Nutzername als y-Wert
-            return {user.username: value for user, value in sorted_dict.items()}
-
-        def apply_label_func(l):
-            return list(map(label_func, l))
-
-        if mode == "bar":
-            data = sorted_dict(d, reverse=True)
-            plt.bar(data.keys(), data.values())
-
-            # x-Ticks rotieren
-            ax = plt.gca()
-            plt.setp(ax.get_xticklabels(), rotation=30,
-                     horizontalalignment='right')
-
-            plt.gca().set_title(title)
-
-        elif mode == "pie":
-            data = sorted_dict(d, reverse=True)
-            # Nutzernamen für die Legende
-            legend_labels = data.keys()
-            values = data.values()
-
-            # Werte als Labels eventuell anpassen
-            if label_func is not None:
-                pie_labels = apply_label_func(values)
-            else:
-                pie_labels = values
-
-            # plot erstellen
-            patches, texts = plt.pie(values, startangle=-90,
-                                     labels=pie_labels, labeldistance=.8,
-                                     colors=self._nicecolors)
-            # Labels anpassen
-            for t in texts:
-                t.set_horizontalalignment("center")
-                t.set_color("white")
-
-            # Titel einfügen
-            plt.gca().set_title(title)
-            # Legende rechts einfügen
-            plt.legend(patches, legend_labels, loc="center left",
-                       bbox_to_anchor=(1.05, 0.5), frameon=False)
-
-        else:
-            raise ValueError(f"Den Modus '{mode}' gibt es nicht.")
-
+    def plot_reply_matrix(self, d: dict, title: str = None, fmt: str = ".0f",
+                          export_path=None, show=False):
+        '''Plots Heatmap nach dem Muster {<Antwortender>: {<Angeschriebener>: Wert}}
+           (z.B. aus Analyzer.reply_matrix)
+           fmt: Format der Werte in den Feldern
+           export_path: falls nicht None -> speichert den plot unter <export_path>
+           show: falls True: zeigt das Diagramma an'''
+        render.draw_heatmap(plt.gca(), (self.reply_matrix_data(d), fmt), title)
         self.plot(show=show, export_path=export_path)
 
+    @profiled
     def plot(self, show=False, export_path=None, transparent=True):
-        plt.gcf().set_size_inches(8, 6)
+        plt.gcf().set_size_inches(*render.FIGSIZE)
         plt.tight_layout()
 
         if export_path is not None:
             # Exportieren
-            plt.savefig(export_path, transparent=transparent, dpi=300, bbox_inches="tight", pad_inches=0.2)
+            plt.savefig(export_path, transparent=transparent, dpi=render.DPI, bbox_inches="tight", pad_inches=0.2)
 
         if show:
             # Plot anzeigen
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+import json
+import time
+import tracemalloc
+
+# reset_peak gibt es erst ab Python 3.9, vorher ist die Spitze seit Beginn der Messung gemeint
+_reset_peak = getattr(tracemalloc, "reset_peak", lambda: None)
+
+
+class Profiler:
+    '''Misst Laufzeit und Speicherspitze (tracemalloc) von verschachtelten
+       Abschnitten (spans) und zählt Ereignisse (counters).
+       Solange der Profiler nicht eingeschaltet ist, kosten span() und
+       count() fast nichts.
+       hooks: Funktionen, die nach jedem Abschnitt mit dessen Messwerten
+              ({"name", "seconds", "peak_mb", "depth", "start"}) aufgerufen werden'''
+
+    def __init__(self) -> None:
+        self._enabled = False
+        self._memory = False
+        self._started = 0.0
+        self._stack = []  # offene Abschnitte
+        self._spans = []  # abgeschlossene Abschnitte
+        self._counters = Counter()
+        self._hooks = []
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self, memory: bool = True) -> None:
+        '''Schaltet die Messung ein (memory: Speicherspitzen mit tracemalloc messen)'''
+        self._enabled = True
+        self._memory = memory
+        self._started = time.perf_counter()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        self._enabled = False
+        if self._memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self) -> None:
+        '''Verwirft alle bisherigen Messwerte'''
+        self._spans.clear()
+        self._counters.clear()
+
+    def add_hook(self, hook) -> None:
+        '''Registriert eine Funktion hook(span: dict) für abgeschlossene Abschnitte'''
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self._hooks.remove(hook)
+
+    def _traced_peak(self) -> int:
+        return tracemalloc.get_traced_memory()[1] if self._memory else 0
+
+    @contextmanager
+    def span(self, name: str):
+        '''Misst den Abschnitt innerhalb des with Blocks'''
+        if not self._enabled:
+            yield
+            return
+
+        if self._stack:
+            # bisherige Spitze dem äußeren Abschnitt zuordnen
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"], self._traced_peak())
+        if self._memory:
+            _reset_peak()
+        current = tracemalloc.get_traced_memory()[0] if self._memory else 0
+        frame = {"name": name, "start_memory": current, "peak": current,
+                 "start": time.perf_counter()}
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            frame["peak"] = max(frame["peak"], self._traced_peak())
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], frame["peak"])
+            if self._memory:
+                _reset_peak()
+
+            span = {"name": name,
+                    "seconds": end - frame["start"],
+                    "peak_mb": (frame["peak"] - frame["start_memory"]) / 1024 ** 2,
+                    "depth": len(self._stack),
+                    "start": frame["start"] - self._started}
+            self._spans.append(span)
+            for hook in self._hooks:
+                hook(span)
+
+    def count(self, name: str, n: int = 1) -> None:
+        '''Erhöht den Zähler name um n'''
+        if self._enabled:
+            self._counters[name] += n
+
+    @property
+    def spans(self) -> list:
+        '''Return alle abgeschlossenen Abschnitte in der Reihenfolge ihres Endes'''
+        return self._spans
+
+    @property
+    def counters(self) -> Counter:
+        return self._counters
+
+    def summary(self) -> dict:
+        '''Return {Name: {"calls", "seconds", "peak_mb", "depth"}} zusammengefasst
+           über alle Aufrufe (in der Reihenfolge des ersten Starts)'''
+        summary = {}
+        for span in sorted(self._spans, key=lambda span: span["start"]):
+            entry = summary.setdefault(span["name"], {"calls": 0, "seconds": 0.0,
+                                                      "peak_mb": 0.0, "depth": span["depth"]})
+            entry["calls"] += 1
+            entry["seconds"] += span["seconds"]
+            entry["peak_mb"] = max(entry["peak_mb"], span["peak_mb"])
+        return summary
+
+    def report(self) -> dict:
+        '''Return alle Messwerte als JSON kompatibles Dictionary'''
+        return {"memory": self._memory,
+                "summary": self.summary(),
+                "counters": dict(self._counters),
+                "spans": self._spans}
+
+    def write(self, filepath: str) -> None:
+        '''Speichert report() als JSON Datei'''
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def format_summary(self) -> str:
+        '''Return die Zusammenfassung als eingerückte Tabelle (für die Konsole)'''
+        lines = [f"{'Abschnitt':60} {'Aufrufe':>7} {'Sekunden':>10} {'Spitze MB':>10}"]
+        for name, entry in self.summary().items():
+            label = "  " * entry["depth"] + name
+            peak = f"{entry['peak_mb']:10.1f}" if self._memory else f"{'-':>10}"
+            lines.append(f"{label:60} {entry['calls']:7} {entry['seconds']:10.3f} {peak}")
+        if self._counters:
+            lines.append("")
+            lines.extend(f"{name:60} {value:>7}" for name, value in sorted(self._counters.items()))
+        return "\n".join(lines)
+
+
+# gemeinsamer Profiler für das ganze Programm
+PROFILER = Profiler()
+
+
+def span(name: str):
+    '''Misst einen Abschnitt mit dem gemeinsamen Profiler (with span("name"): ...)'''
+    return PROFILER.span(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    '''Erhöht einen Zähler des gemeinsamen Profilers'''
+    PROFILER.count(name, n)
+
+
+def profiled(func):
+    '''Decorator: misst jeden Aufruf der Funktion als Abschnitt "Klasse.methode"'''
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return func(*args, **kwargs)
+        with PROFILER.span(name):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+import numpy as np
+
+from timestamps import to_seconds
+
+
+def as_seconds(value) -> int:
+    '''Return Sekunden seit EPOCH für datetime, date (Mitternacht)
+       oder Text im ISO Format ("2020-01-31" bzw. "2020-01-31T12:00")'''
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(
+                f"'{value}' ist kein gültiges Datum. Versuch es mal mit dem Format JJJJ-MM-TT") from None
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return to_seconds(value)
+
+
+class MessageIndex:
+    '''Sortierte Zeitstempel und Nachrichtennummern pro Nutzer, damit Zeitfenster
+       per Binärsuche bestimmt werden, statt Nachrichten zu filtern.
+       Wird aus den Arrays der ChatAggregates gebaut, die Nachrichten selbst
+       werden nicht kopiert.'''
+
+    def __init__(self, aggregates) -> None:
+        timestamps = aggregates.timestamps
+        user_codes = aggregates.user_codes
+        self._aggregates = aggregates
+        self._timestamps = timestamps
+        self._usernames = list(aggregates.usernames)
+        self._codes = {username: code for code, username in enumerate(self._usernames)}
+
+        # Exporte sind normalerweise chronologisch, dann ist jedes Zeitfenster
+        # ein zusammenhängender Bereich [lo, hi) der Nachrichtennummern
+        self._chronological = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+        if self._chronological:
+            self._order = None
+            self._sorted = timestamps
+        else:
+            self._order = np.argsort(timestamps, kind="stable")
+            self._sorted = timestamps[self._order]
+
+        # Nachrichtennummern jedes Nutzers (aufsteigend) und deren Zeitstempel
+        by_user = np.argsort(user_codes, kind="stable")
+        bounds = np.cumsum(np.bincount(user_codes, minlength=len(self._usernames)))
+        self._user_positions = np.split(by_user, bounds[:-1])
+        self._user_timestamps = [timestamps[positions] for positions in self._user_positions]
+
+        # Beginn der Worte jeder Nachricht in aggregates.tokens[Nutzer]
+        word_counts = aggregates.msg_word_counts
+        self._token_offsets = [np.concatenate(([0], np.cumsum(word_counts[positions], dtype=np.int64)))
+                               for positions in self._user_positions]
+
+    @property
+    def chronological(self) -> bool:
+        return self._chronological
+
+    @property
+    def usernames(self) -> list:
+        '''Return Nutzernamen, Index = Nutzernummer'''
+        return self._usernames
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps
+
+    @property
+    def user_codes(self) -> np.ndarray:
+        return self._aggregates.user_codes
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def user_code(self, user) -> int:
+        '''Return die Nutzernummer für einen Nutzernamen oder ein User Objekt'''
+        username = getattr(user, "username", user)
+        try:
+            return self._codes[username]
+        except KeyError:
+            raise ValueError(
+                f"Den Nutzer '{username}' gibt es nicht. Versuch es mal mit {', '.join(self._usernames)}") from None
+
+    def window(self, lo: int, hi: int):
+        '''Return Index (Slice bzw. Nummern in Chatreihenfolge) der Nachrichten
+           mit den Rängen lo bis hi in der zeitlichen Sortierung'''
+        if self._chronological:
+            return slice(lo, hi)
+        return np.sort(self._order[lo:hi])
+
+    def user_range(self, code: int, start: int = None, end: int = None):
+        '''Return Index (Slice bzw. Nummern) in die Nachrichten des Nutzers
+           mit Zeitstempel von start bis end (exklusive)'''
+        user_timestamps = self._user_timestamps[code]
+        if self._chronological:
+            a = 0 if start is None else int(np.searchsorted(user_timestamps, start, "left"))
+            b = len(user_timestamps) if end is None \
+                else int(np.searchsorted(user_timestamps, end, "left"))
+            return slice(a, max(a, b))
+        mask = np.ones(len(user_timestamps), dtype=bool)
+        if start is not None:
+            mask &= user_timestamps >= start
+        if end is not None:
+            mask &= user_timestamps < end
+        return np.flatnonzero(mask)
+
+    def user_positions(self, code: int, user_range=slice(None)) -> np.ndarray:
+        '''Return die Nummern der Nachrichten des Nutzers (aufsteigend)'''
+        return self._user_positions[code][user_range]
+
+    def user_tokens(self, code: int, user_range=None) -> np.ndarray:
+        '''Return die Wort ids der Nachrichten user_range des Nutzers
+           (bei einem Slice als View auf aggregates.tokens)'''
+        username = self._usernames[code]
+        tokens = self._aggregates.tokens.get(username)
+        tokens = np.empty(0, dtype=np.uint32) if tokens is None \
+            else np.frombuffer(tokens, dtype=np.uint32)
+        if user_range is None:
+            return tokens
+        offsets = self._token_offsets[code]
+        if isinstance(user_range, slice):
+            return tokens[offsets[user_range.start]:offsets[user_range.stop]]
+        # Worte einzelner Nachrichten einsammeln
+        starts = offsets[user_range]
+        lengths = offsets[user_range + 1] - starts
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return tokens[np.repeat(starts, lengths) + within]
+
+    def select(self, since=None, until=None, users=None) -> "Selection":
+        '''Return die Nachrichten von since (inklusive) bis until (exklusive)
+           der Nutzer users (Nutzernamen oder User Objekte, None = alle)
+           since / until: datetime, date oder Text im ISO Format, None = ohne Grenze'''
+        start = None if since is None else as_seconds(since)
+        end = None if until is None else as_seconds(until)
+        lo = 0 if start is None else int(np.searchsorted(self._sorted, start, "left"))
+        hi = len(self) if end is None else int(np.searchsorted(self._sorted, end, "left"))
+        if users is None:
+            codes = range(len(self._usernames))
+        else:
+            if isinstance(users, str):
+                users = [users]
+            codes = sorted({self.user_code(user) for user in users})
+        return Selection(self, start, end, lo, max(lo, hi), tuple(codes))
+
+
+class Selection:
+    '''Ausschnitt eines Chats: Nachrichten im Zeitfenster [since, until) von
+       bestimmten Nutzern. Bei chronologischen Chats sind alle Bereiche Slices,
+       also Views auf die Arrays der ChatAggregates ohne Kopie.'''
+
+    def __init__(self, index: MessageIndex, start: int, end: int,
+                 lo: int, hi: int, codes: tuple) -> None:
+        self._index = index
+        self._start = start
+        self._end = end
+        self._lo = lo
+        self._hi = hi
+        self._codes = codes
+
+    @property
+    def key(self) -> tuple:
+        '''Return Schlüssel für Zwischenergebnisse (gleicher Ausschnitt -> gleicher Schlüssel)'''
+        return self._lo, self._hi, self._codes
+
+    @property
+    def window_key(self) -> tuple:
+        '''Return Schlüssel nur für das Zeitfenster (ohne Nutzer)'''
+        return self._lo, self._hi
+
+    @property
+    def codes(self) -> tuple:
+        '''Return die ausgewählten Nutzernummern (aufsteigend)'''
+        return self._codes
+
+    @property
+    def usernames(self) -> set:
+        '''Return die ausgewählten Nutzernamen'''
+        return {self._index.usernames[code] for code in self._codes}
+
+    @property
+    def all_users(self) -> bool:
+        return len(self._codes) == len(self._index.usernames)
+
+    @property
+    def window(self):
+        '''Return Index (Slice bzw. Nummern) aller Nachrichten im Zeitfenster
+           (alle Nutzer, in Chatreihenfolge) für numpy Arrays'''
+        return self._index.window(self._lo, self._hi)
+
+    @property
+    def positions(self):
+        '''Return Index (Slice bzw. Nummern) der ausgewählten Nachrichten
+           (in Chatreihenfolge) für numpy Arrays'''
+        if self.all_users:
+            return self.window
+        return np.sort(np.concatenate([self.user_positions(code) for code in self._codes]))
+
+    def message_ids(self) -> np.ndarray:
+        '''Return die Nummern der ausgewählten Nachrichten als Array'''
+        positions = self.positions
+        if isinstance(positions, slice):
+            return np.arange(positions.start, positions.stop)
+        return positions
+
+    def user_positions(self, code: int) -> np.ndarray:
+        '''Return die Nummern der Nachrichten eines Nutzers im Zeitfenster'''
+        return self._index.user_positions(code, self._index.user_range(code, self._start, self._end))
+
+    def user_tokens(self, code: int) -> np.ndarray:
+        '''Return die Wort ids eines Nutzers im Zeitfenster'''
+        return self._index.user_tokens(code, self._index.user_range(code, self._start, self._end))
+
+    def user_counts(self) -> np.ndarray:
+        '''Return Anzahl der Nachrichten pro Nutzernummer (0 für nicht ausgewählte)'''
+        counts = np.zeros(len(self._index.usernames), dtype=np.int64)
+        for code in self._codes:
+            user_range = self._index.user_range(code, self._start, self._end)
+            counts[code] = user_range.stop - user_range.start \
+                if isinstance(user_range, slice) else len(user_range)
+        return counts
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        '''Return Maske, welche der Nachrichtennummern ids ausgewählt sind'''
+        ids = np.asarray(ids, dtype=np.int64)
+        timestamps = self._index.timestamps[ids]
+        mask = np.ones(len(ids), dtype=bool)
+        if self._start is not None:
+            mask &= timestamps >= self._start
+        if self._end is not None:
+            mask &= timestamps < self._end
+        if not self.all_users:
+            selected = np.zeros(len(self._index.usernames), dtype=bool)
+            selected[list(self._codes)] = True
+            mask &= selected[self._index.user_codes[ids]]
+        return mask
+
+    def __len__(self) -> int:
+        return int(self.user_counts().sum())
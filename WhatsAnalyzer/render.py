@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from matplotlib.artist import setp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.ticker as ticker
+import seaborn as sns
+
+from chartdata import NICECOLORS
+from profiling import profiled
+
+# Aussehen aller Diagramme (wird in jedem Prozess über apply_style gesetzt)
+FONT = "Franklin Gothic Book"
+STYLE = {"axes.axisbelow": False,
+         "axes.edgecolor": "lightgrey",
+         "axes.facecolor": "None",
+         "axes.grid": False,
+         "axes.labelcolor": "dimgrey",
+         "axes.spines.right": False,
+         "axes.spines.top": False,
+         "figure.facecolor": "white",
+         "lines.solid_capstyle": "round",
+         "patch.edgecolor": "w",
+         "patch.force_edgecolor": True,
+         "text.color": "dimgrey",
+         "xtick.bottom": False,
+         "xtick.color": "dimgrey",
+         "xtick.direction": "out",
+         "xtick.top": False,
+         "ytick.color": "dimgrey",
+         "ytick.direction": "out",
+         "ytick.left": False,
+         "ytick.right": False}
+
+FIGSIZE = (8, 6)
+DPI = 300
+
+
+def apply_style() -> None:
+    '''Verschönert die Matplotlib Darstellung'''
+    sns.set(font=FONT, rc=STYLE)
+
+
+def _rotate_xticks(ax) -> None:
+    setp(ax.get_xticklabels(), rotation=30, horizontalalignment="right")
+
+
+def draw_weekly_bars(ax, data, title: str = None) -> None:
+    '''Balken pro Woche, data: pd.Series {Wochenende: Anzahl}'''
+    data.plot(kind="bar", title=title, ax=ax)
+
+    # tick Formatierung
+    ticklabels = [""]*len(data.index)
+    ticklabels[::4] = [item.strftime('%b %d') for item in data.index[::4]]
+    ticklabels[::12] = [item.strftime('%b %d\n%Y')
+                        for item in data.index[::12]]
+    ax.xaxis.set_major_formatter(ticker.FixedFormatter(ticklabels))
+    ax.set_xlabel("Zeit")
+    ax.figure.autofmt_xdate()
+
+
+def draw_user_lines(ax, data, title: str = None) -> None:
+    '''Eine Linie pro Nutzer, data: [(Label, x Werte, y Werte), ...]'''
+    for label, x_data, y_data in data:
+        ax.plot(x_data, y_data, label=label)
+    ax.legend()
+    ax.set_title(title)
+
+
+def draw_grouped_bars(ax, data, title: str = None) -> None:
+    '''Balken pro Gruppe, data: (pd.Series {Gruppe: Anzahl}, x-Label)'''
+    series, xlabel = data
+    series.plot.bar(title=title, ax=ax)
+    ax.set_xlabel(xlabel)
+    _rotate_xticks(ax)
+
+
+def draw_user_bars(ax, data, title: str = None) -> None:
+    '''Balken pro Nutzer, data: {"values": {Nutzername: Wert}}'''
+    values = data["values"]
+    ax.bar(list(values.keys()), list(values.values()))
+    _rotate_xticks(ax)
+    ax.set_title(title)
+
+
+def draw_user_pie(ax, data, title: str = None) -> None:
+    '''Kuchendiagramm, data: {"values": {Nutzername: Wert}, "labels": [Label, ...]}'''
+    values = data["values"]
+    patches, texts = ax.pie(list(values.values()), startangle=-90,
+                            labels=data["labels"], labeldistance=.8,
+                            colors=NICECOLORS)
+    # Labels anpassen
+    for t in texts:
+        t.set_horizontalalignment("center")
+        t.set_color("white")
+
+    ax.set_title(title)
+    # Legende rechts einfügen
+    ax.legend(patches, list(values.keys()), loc="center left",
+              bbox_to_anchor=(1.05, 0.5), frameon=False)
+
+
+def draw_heatmap(ax, data, title: str = None) -> None:
+    '''Heatmap, data: (pd.DataFrame [Antwortender, Angeschriebener], Format der Werte)'''
+    frame, fmt = data
+    sns.heatmap(frame, annot=True, fmt=fmt, cmap="Blues", cbar=False, square=True, ax=ax)
+    ax.set_xlabel("Angeschrieben")
+    ax.set_ylabel("Antwortet")
+    ax.set_title(title)
+
+
+DRAW = {"weekly_bars": draw_weekly_bars,
+        "user_lines": draw_user_lines,
+        "grouped_bars": draw_grouped_bars,
+        "bar": draw_user_bars,
+        "pie": draw_user_pie,
+        "heatmap": draw_heatmap}
+
+
+@profiled
+def render_figure(job: tuple) -> str:
+    '''Zeichnet ein Diagramm ohne pyplot (eigene Figure mit Agg Canvas)
+       und speichert es als Bild
+       job: (Diagrammtyp aus DRAW, Daten, Titel, export_path)
+       Return export_path'''
+    kind, data, title, export_path = job
+    fig = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(fig)
+    DRAW[kind](fig.add_subplot(), data, title)
+    fig.tight_layout()
+    fig.savefig(export_path, transparent=True, dpi=DPI,
+                bbox_inches="tight", pad_inches=0.2)
+    return export_path
+
+
+@profiled
+def render_all(jobs: list, workers: int = 1) -> list:
+    '''Zeichnet mehrere Diagramme, bei workers > 1 parallel in eigenen Prozessen
+       jobs: [(Diagrammtyp, Daten, Titel, export_path), ...]
+       workers: Anzahl der Prozesse (0 = alle Kerne)
+       Return Liste der export_paths'''
+    if workers <= 0:
+        workers = os.cpu_count()
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [render_figure(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=apply_style) as executor:
+        return list(executor.map(render_figure, jobs))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def replies(timestamps: np.ndarray, user_codes: np.ndarray, user_count: int,
+            gap: float = None, percentiles: tuple = (25, 50, 75, 90)) -> dict:
+    '''Bestimmt in einem Durchlauf, wer wem wie schnell antwortet.
+       Als Antwort zählt die erste Nachricht eines Nutzers nach der Nachricht
+       eines anderen Nutzers (aufeinanderfolgende Nachrichten desselben
+       Nutzers werden übersprungen).
+       gap: längere Pausen (in Minuten) gelten nicht als Antwort, sondern
+            als neue Unterhaltung (wie bei sessions)
+       Return {"counts": Matrix [Antwortender, Angeschriebener] mit Anzahl der Antworten,
+               "mean_latency": Matrix mit durchschnittlicher Antwortzeit in Minuten,
+               "percentiles": {p: Antwortzeit in Minuten pro Nutzernummer}}'''
+    latency = np.diff(timestamps) / 60
+    replier = user_codes[1:].astype(np.int64)
+    replied_to = user_codes[:-1].astype(np.int64)
+
+    mask = (replier != replied_to) & (latency >= 0)
+    if gap is not None:
+        mask &= latency <= gap
+    latency, replier, replied_to = latency[mask], replier[mask], replied_to[mask]
+
+    # Matrix über einen flachen Index (Zeile * Spaltenanzahl + Spalte) füllen
+    flat = replier * user_count + replied_to
+    size = user_count * user_count
+    counts = np.bincount(flat, minlength=size).reshape(user_count, user_count)
+    latency_sum = np.bincount(flat, weights=latency, minlength=size)
+    with np.errstate(invalid="ignore"):
+        mean_latency = latency_sum.reshape(user_count, user_count) / counts
+
+    # Antwortzeiten nach Nutzer sortieren und gruppenweise auswerten
+    order = np.argsort(replier, kind="stable")
+    groups = np.split(latency[order], np.cumsum(np.bincount(replier, minlength=user_count))[:-1])
+    user_percentiles = {p: np.array([np.percentile(g, p) if len(g) else np.nan
+                                     for g in groups])
+                        for p in percentiles}
+
+    return {"counts": counts,
+            "mean_latency": mean_latency,
+            "percentiles": user_percentiles}
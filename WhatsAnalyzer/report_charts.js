@@ -0,0 +1,176 @@
+// Zeichnet die Diagramme des interaktiven Reports als SVG (ohne externe Bibliotheken).
+// Erwartet window.REPORT_DATA = {"colors": [...], "charts": [{id, type, labels, ...}, ...]}
+(function () {
+  "use strict";
+
+  var SVG_NS = "http://www.w3.org/2000/svg";
+  var WIDTH = 800, HEIGHT = 500;
+  var MARGIN = { top: 20, right: 20, bottom: 90, left: 60 };
+  var TEXT_COLOR = "dimgrey", AXIS_COLOR = "lightgrey";
+
+  function el(name, attrs, parent) {
+    var node = document.createElementNS(SVG_NS, name);
+    for (var key in attrs) {
+      node.setAttribute(key, attrs[key]);
+    }
+    if (parent) {
+      parent.appendChild(node);
+    }
+    return node;
+  }
+
+  function text(parent, x, y, content, attrs) {
+    var node = el("text", Object.assign({ x: x, y: y, fill: TEXT_COLOR, "font-size": 13 }, attrs || {}), parent);
+    node.textContent = content;
+    return node;
+  }
+
+  function tooltip(node, content) {
+    el("title", {}, node).textContent = content;
+  }
+
+  function format(value) {
+    return Math.round(value * 10) / 10;
+  }
+
+  function niceMax(value) {
+    if (value <= 0) {
+      return 1;
+    }
+    var step = Math.pow(10, Math.floor(Math.log10(value)));
+    var factors = [1, 2, 2.5, 5, 10];
+    for (var i = 0; i < factors.length; i++) {
+      if (factors[i] * step >= value) {
+        return factors[i] * step;
+      }
+    }
+    return 10 * step;
+  }
+
+  function svgFor(container) {
+    return el("svg", { viewBox: "0 0 " + WIDTH + " " + HEIGHT, width: "100%", role: "img" }, container);
+  }
+
+  // y-Achse mit 5 Hilfslinien, Return Funktion Wert -> y Koordinate
+  function yAxis(svg, maxValue) {
+    var top = niceMax(maxValue);
+    var plotHeight = HEIGHT - MARGIN.top - MARGIN.bottom;
+    var scale = function (value) {
+      return MARGIN.top + plotHeight * (1 - value / top);
+    };
+    for (var i = 0; i <= 5; i++) {
+      var value = top * i / 5;
+      var y = scale(value);
+      el("line", { x1: MARGIN.left, x2: WIDTH - MARGIN.right, y1: y, y2: y,
+                   stroke: AXIS_COLOR, "stroke-width": i === 0 ? 1 : 0.5 }, svg);
+      text(svg, MARGIN.left - 8, y + 4, format(value), { "text-anchor": "end" });
+    }
+    return scale;
+  }
+
+  // x-Labels (bei vielen Balken nur jedes k-te), schräg wie in den PNG Graphen
+  function xLabels(svg, labels, xFor) {
+    var every = Math.max(1, Math.ceil(labels.length / 26));
+    for (var i = 0; i < labels.length; i += every) {
+      var x = xFor(i), y = HEIGHT - MARGIN.bottom + 16;
+      text(svg, x, y, labels[i], { "text-anchor": "end", transform: "rotate(-30 " + x + " " + y + ")" });
+    }
+  }
+
+  function bar(container, chart, colors) {
+    var svg = svgFor(container);
+    var values = chart.values;
+    var scale = yAxis(svg, Math.max.apply(null, values.concat([0])));
+    var slot = (WIDTH - MARGIN.left - MARGIN.right) / Math.max(values.length, 1);
+    var xFor = function (i) {
+      return MARGIN.left + slot * (i + 0.5);
+    };
+    values.forEach(function (value, i) {
+      var rect = el("rect", { x: xFor(i) - slot * 0.35, width: slot * 0.7, y: scale(value),
+                              height: scale(0) - scale(value), fill: colors[0] }, svg);
+      tooltip(rect, chart.labels[i] + ": " + format(value));
+    });
+    xLabels(svg, chart.labels, xFor);
+  }
+
+  function line(container, chart, colors) {
+    var svg = svgFor(container);
+    var maxValue = 0;
+    chart.series.forEach(function (series) {
+      maxValue = Math.max(maxValue, Math.max.apply(null, series.values.concat([0])));
+    });
+    var scale = yAxis(svg, maxValue);
+    var count = chart.labels.length;
+    var step = (WIDTH - MARGIN.left - MARGIN.right) / Math.max(count - 1, 1);
+    var xFor = function (i) {
+      return MARGIN.left + step * i;
+    };
+    chart.series.forEach(function (series, s) {
+      var color = colors[s % colors.length];
+      var points = series.values.map(function (value, i) {
+        return xFor(i) + "," + scale(value);
+      });
+      var path = el("polyline", { points: points.join(" "), fill: "none", stroke: color,
+                                  "stroke-width": 2, "stroke-linejoin": "round" }, svg);
+      tooltip(path, series.name);
+      // Legende oben links
+      var y = MARGIN.top + 8 + s * 18;
+      el("rect", { x: MARGIN.left + 10, y: y - 9, width: 18, height: 4, fill: color }, svg);
+      text(svg, MARGIN.left + 34, y, series.name);
+    });
+    xLabels(svg, chart.labels, xFor);
+  }
+
+  function pie(container, chart, colors) {
+    var svg = svgFor(container);
+    var total = chart.values.reduce(function (a, b) { return a + b; }, 0);
+    var cx = WIDTH * 0.38, cy = HEIGHT / 2, r = HEIGHT * 0.42;
+    // wie bei matplotlib (startangle=-90): Start unten, gegen den Uhrzeigersinn
+    var angle = Math.PI / 2;
+    chart.values.forEach(function (value, i) {
+      var color = colors[i % colors.length];
+      var share = total > 0 ? value / total : 0;
+      var next = angle - share * 2 * Math.PI;
+      var slice;
+      if (share >= 0.9999) {
+        slice = el("circle", { cx: cx, cy: cy, r: r, fill: color }, svg);
+      } else {
+        var x1 = cx + r * Math.cos(angle), y1 = cy + r * Math.sin(angle);
+        var x2 = cx + r * Math.cos(next), y2 = cy + r * Math.sin(next);
+        var large = share > 0.5 ? 1 : 0;
+        slice = el("path", { d: "M" + cx + "," + cy + " L" + x1 + "," + y1 +
+                                " A" + r + "," + r + " 0 " + large + " 0 " + x2 + "," + y2 + " Z",
+                             fill: color, stroke: "white", "stroke-width": 2 }, svg);
+      }
+      tooltip(slice, chart.legend[i] + ": " + chart.labels[i]);
+      if (share > 0.03) {
+        var middle = (angle + next) / 2;
+        text(svg, cx + r * 0.7 * Math.cos(middle), cy + r * 0.7 * Math.sin(middle) + 4,
+             chart.labels[i], { fill: "white", "text-anchor": "middle" });
+      }
+      // Legende rechts
+      var y = cy - chart.values.length * 12 + i * 24;
+      el("rect", { x: WIDTH * 0.72, y: y - 10, width: 14, height: 14, fill: color }, svg);
+      text(svg, WIDTH * 0.72 + 22, y + 2, chart.legend[i]);
+      angle = next;
+    });
+  }
+
+  var DRAW = { bar: bar, line: line, pie: pie };
+
+  function drawAll() {
+    var data = window.REPORT_DATA;
+    data.charts.forEach(function (chart) {
+      var container = document.getElementById(chart.id);
+      if (container) {
+        DRAW[chart.type](container, chart, data.colors);
+      }
+    });
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", drawAll);
+  } else {
+    drawAll();
+  }
+})();
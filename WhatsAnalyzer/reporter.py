@@ -2,38 +2,84 @@
 
 from rich.console import Console
 from rich.table import Table
+import json
 import os
 from os import path
 
-from plotter import Plotter
 from analyzer import Analyzer
+import chartdata
+from profiling import profiled
+from serialize import to_json
+from timeline import WEEKDAY_NAMES
+
+# (Name des Graphen, Überschrift) in der Reihenfolge des HTML Reports
+REPORT_CARDS = [
+    ("msg_per_user", "Nachrichten pro Nutzer"),
+    ("media_per_user", "Medienanzahl pro Nutzer"),
+    ("conv_start", "Wie oft hat der Nutzer die Unterhaltung gestartet?"),
+    ("msg_len_per_user", "Durchschnittliche Anzahl an Worten pro Nachricht"),
+    ("msg_by_weekday", "Nachrichten pro Wochentag"),
+    ("msg_by_hour", "Nachrichten pro Uhrzeit"),
+    ("msg_per_week", "Nachrichten pro Woche"),
+    ("msg_per_person_per_week", "Nachrichten pro Woche pro Nutzer"),
+]
 
 
 class Reporter:
-    def __init__(self, chatname):
-        self._analyzer = Analyzer(chatname)
-        self._plotter = Plotter(self._analyzer.manager.messages)
+    def __init__(self, chatname, workers: int = 1, use_cache: bool = True,
+                 output_name: str = None):
+        '''output_name: Name für Plotordner und Reports (Standard: Dateiname ohne ".txt"
+                        in Kleinbuchstaben), im Batch Modus eindeutig vergeben'''
+        self._analyzer = Analyzer(chatname, workers=workers, use_cache=use_cache)
+        self._plotter = None  # erst beim ersten Graphen (siehe plotter)
         self._chatname = chatname
+        self._workers = workers  # auch für das Zeichnen der Graphen
 
-        self._chatname_base = path.splitext(
-            self._chatname)[0].lower()  # Dateiname ohne ".txt"
+        self._chatname_base = output_name or path.splitext(
+            path.basename(self._chatname))[0].lower()  # Dateiname ohne ".txt"
         self._project_basedir = path.dirname(os.getcwd())  # Projekt Root
         self._chat_plot_dir = path.join(
             self._project_basedir, "plots", self._chatname_base)  # Plotordner für den chat
         self._rel_chat_plot_dir = fr"\{path.relpath(self._chat_plot_dir, self._project_basedir)}"
 
 
-    def folder_setup(self):
-        '''Erstellt die benötigten Ordner'''
+    @property
+    def analyzer(self) -> Analyzer:
+        return self._analyzer
+
+    @property
+    def plotter(self):
+        '''Return den Plotter, pandas / matplotlib / seaborn / scipy werden erst
+           hier importiert (ohne Graphen startet das Programm deutlich schneller)'''
+        if self._plotter is None:
+            from plotter import Plotter
+            manager = self._analyzer.manager
+            # Nachrichten erst, wenn der Plotter Text Spalten braucht (add_columns)
+            self._plotter = Plotter(lambda: manager.messages, manager.aggregates)
+        return self._plotter
+
+    @property
+    def report_path(self) -> str:
+        '''Return den Pfad des HTML Reports im Reportordner'''
+        return path.join(self._project_basedir, "reports", f"{self._chatname_base}_report.html")
+
+    @property
+    def results_path(self) -> str:
+        '''Return den Pfad der JSON Ergebnisse im Reportordner'''
+        return path.join(self._project_basedir, "reports", f"{self._chatname_base}_results.json")
+
+    def folder_setup(self, plots: bool = True):
+        '''Erstellt die benötigten Ordner
+           plots: falls False werden keine Plotordner angelegt (nur JSON Ergebnisse)'''
         if not path.exists(f"{self._project_basedir}/chats"):
             os.makedirs(f"{self._project_basedir}/chats")
             print("Chatordner erstellt")
 
-        if not path.exists(f"{self._project_basedir}/plots"):
+        if plots and not path.exists(f"{self._project_basedir}/plots"):
             os.makedirs(f"{self._project_basedir}/plots")
             print("Plotordner erstellt")
 
-        if not path.exists(self._chat_plot_dir):
+        if plots and not path.exists(self._chat_plot_dir):
             os.makedirs(self._chat_plot_dir)
             print("Chatspeziefischer Plotordner erstellt")
 
@@ -41,58 +87,77 @@ class Reporter:
             os.makedirs(f"{self._project_basedir}/reports")
             print("Reportordner erstellt")
 
-    def create_report(self):
-        self.folder_setup()
-        self.export_graphs()
-        self.create_html_report()
+    @profiled
+    def create_report(self, interactive: bool = False, plots: bool = True):
+        '''interactive: falls True werden keine PNG Graphen erzeugt,
+                        sondern im HTML Report direkt gezeichnet
+           plots: falls False werden statt Graphen und HTML Report nur die
+                  Ergebnisse als JSON gespeichert (ohne Plotbibliotheken)'''
+        self.folder_setup(plots)
+        if not plots:
+            self.export_json()
+        else:
+            if not interactive:
+                self.export_graphs()
+            self.create_html_report(interactive=interactive)
         self.cmd_out()
 
+    def _graph_builders(self) -> dict:
+        '''Return {Name des Graphen: (Diagrammtyp, Funktion, die die Daten berechnet)}
+           in der Reihenfolge, in der die Graphen gezeichnet werden'''
+        analyzer = self._analyzer
+
+        return {
+            # Nachrichtenverlauf pro Nutzer
+            "msg_per_person_per_week": (
+                "user_lines", lambda: self.plotter.user_messages_over_time_data()),
+            # Nachrichten gruppiert nach Stunde
+            "msg_by_hour": (
+                "grouped_bars", lambda: self.plotter.group_messages_by_data("hour")),
+            # Nachrichten gruppiert nach Wochentag
+            "msg_by_weekday": (
+                "grouped_bars", lambda: self.plotter.group_messages_by_data("weekday")),
+            # Nachrichtenverlauf (pro Woche)
+            "msg_per_week": (
+                "weekly_bars", lambda: self.plotter.total_messages_over_time_data()),
+            # Nachrichten pro Nutzer
+            "msg_per_user": ("pie", lambda: chartdata.user_vs_number_data(
+                analyzer.user_msg_count(), "pie")),
+            # Erste Nachricht des Tages Counter
+            "conv_start": ("pie", lambda: chartdata.user_vs_number_data(
+                analyzer.user_start_conversation(), "pie", label_func=lambda s: f"{s}%")),
+            # Medien Anzahl pro Nutzer
+            "media_per_user": ("pie", lambda: chartdata.user_vs_number_data(
+                analyzer.user_count_media(sum_only=True), "pie")),
+            # Durchschnittliche Wortanzahl pro Nachricht pro Nutzer
+            "msg_len_per_user": ("bar", lambda: chartdata.user_vs_number_data(
+                analyzer.user_avg_word_count(), "bar")),
+        }
+
+    def graph_jobs(self, names: list = None) -> list:
+        '''Return [(Diagrammtyp, Daten, Titel, Name), ...] für render.py
+           names: Namen der Graphen (Standard: alle)'''
+        builders = self._graph_builders()
+        if names is None:
+            names = list(builders)
+        for name in names:
+            if name not in builders:
+                raise ValueError(
+                    f"Den Graphen '{name}' gibt es nicht. Versuch es mal mit {', '.join(builders)}")
+        return [(builders[name][0], builders[name][1](), None, name) for name in names]
+
+    @profiled
     def export_graphs(self) -> None:
-        '''Erstellt und exportiert Graphen aus den Ergebnissen'''
-
-        # Nachrichtenverlauf pro Nutzer
-        self._plotter.plot_user_messages_over_time(
-            title=None,
-            export_path=f"{self._chat_plot_dir}/msg_per_person_per_week.png")
-
-        # Nachrichten gruppiert nach Stunde
-        self._plotter.plot_group_messeges_by(
-            "hour", export_path=f"{self._chat_plot_dir}/msg_by_hour.png")
-
-        # Nachrichten gruppiert nach Wochentag
-        self._plotter.plot_group_messeges_by(
-            "weekday", export_path=f"{self._chat_plot_dir}/msg_by_weekday.png")
-
-        # Nachrichtenverlauf (pro Woche)
-        self._plotter.plot_total_messages_over_time(
-            title=None,
-            export_path=f"{self._chat_plot_dir}/msg_per_week.png")
-
-        # Nachrichten pro Nutzer
-        self._plotter.plot_user_vs_number_dict(self._analyzer.user_msg_count(),
-                                               title=None,
-                                               mode="pie",
-                                               export_path=f"{self._chat_plot_dir}/msg_per_user.png")
-
-        # Erste Nachricht des Tages Counter
-        self._plotter.plot_user_vs_number_dict(self._analyzer.user_start_conversation(),
-                                               title=None,
-                                               mode="pie",
-                                               label_func=lambda s: f"{s}%",
-                                               export_path=f"{self._chat_plot_dir}/conv_start.png")
-
-        # Medien Anzahl pro Nutzer
-        self._plotter.plot_user_vs_number_dict(self._analyzer.user_count_media(sum_only=True),
-                                               title=None,
-                                               mode="pie",
-                                               export_path=f"{self._chat_plot_dir}/media_per_user.png")
-
-        # Durchschnittliche Wortanzahl pro Nachricht pro Nutzer
-        self._plotter.plot_user_vs_number_dict(self._analyzer.user_avg_word_count(),
-                                               title=None,
-                                               mode="bar",
-                                               export_path=f"{self._chat_plot_dir}/msg_len_per_user.png")
+        '''Erstellt und exportiert Graphen aus den Ergebnissen
+           (bei mehreren workers parallel in eigenen Prozessen)'''
+        import render
 
+        # gezeichnet wird in render.py
+        render.render_all([(kind, data, title, path.join(self._chat_plot_dir, f"{name}.png"))
+                           for kind, data, title, name in self.graph_jobs()],
+                          workers=self._workers)
+
+    @profiled
     def cmd_out(self):
         '''Zeigt Ergebnisse in der Konsole an'''
         con = Console()
@@ -152,8 +217,9 @@ class Reporter:
         user_most_common_table(most_common_emojis)
         print()
 
-    def create_html_report(self):
-        html_str = fr'''
+    def _html_page(self, cards: str, scripts: str = "") -> str:
+        '''Return die komplette HTML Seite mit den Karten (cards) und Skripten'''
+        return fr'''
 <!DOCTYPE html>
 <html>
   <head>
@@ -232,126 +298,153 @@ class Reporter:
     <div class="container text-center text-muted" style="min-width: 90vw">
       <!-- cards -->
       <div class="row">
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_per_user.png")}"
-              alt="msg_by_user"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Nachrichten pro Nutzer</h2>
-            </div>
-          </div>
-        </div>
-
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "media_per_user.png")}"
-              alt="media_per_user"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Medienanzahl pro Nutzer</h2>
-            </div>
-          </div>
-        </div>
-
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "conv_start.png")}"
-              alt="conv_start"
-            />
-            <div class="card-block">
-              <h2 class="card-title">
-                Wie oft hat der Nutzer die Unterhaltung gestartet?
-              </h2>
-            </div>
-          </div>
-        </div>
-
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_len_per_user.png")}"
-              alt="msg_len_per_user"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Durchschnittliche Anzahl an Worten pro Nachricht</h2>
-            </div>
-          </div>
-        </div>
-
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_by_weekday.png")}"
-              alt="msg_by_weekday"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Nachrichten pro Wochentag</h2>
-            </div>
-          </div>
-        </div>
+{cards}
+      </div>
+    </div>
+{scripts}
+  </body>
+</html>
 
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_by_hour.png")}"
-              alt="msg_by_hour"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Nachrichten pro Uhrzeit</h2>
-            </div>
-          </div>
-        </div>
+'''
 
-        <div class="col-lg-12 col-xl-6 mb-4">
+    def _html_card(self, content: str, title: str) -> str:
+        return f'''        <div class="col-lg-12 col-xl-6 mb-4">
           <div class="card h-100">
-            <img
-              class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_per_week.png")}"
-              alt="msg_by_hour"
-            />
+{content}
             <div class="card-block">
-              <h2 class="card-title">Nachrichten pro Woche</h2>
+              <h2 class="card-title">{title}</h2>
             </div>
           </div>
         </div>
+'''
 
-        <div class="col-lg-12 col-xl-6 mb-4">
-          <div class="card h-100">
-            <img
+    @profiled
+    def _report_data(self) -> dict:
+        '''Return die Daten aller Diagramme des interaktiven Reports
+           (nur aggregierte Werte, keine einzelnen Nachrichten)'''
+        analyzer = self._analyzer
+
+        def user_chart(chart_id, chart_type, d, label_func=None):
+            data = chartdata.user_vs_number_data(d, chart_type, label_func)
+            chart = {"id": chart_id, "type": chart_type,
+                     "values": list(data["values"].values())}
+            if chart_type == "pie":
+                chart["legend"] = list(data["values"].keys())
+                chart["labels"] = [str(label) for label in data["labels"]]
+            else:
+                chart["labels"] = list(data["values"].keys())
+            return chart
+
+        def bucket_chart(chart_id, d, label_func=str):
+            return {"id": chart_id, "type": "bar",
+                    "labels": [label_func(key) for key in d.keys()],
+                    "values": list(d.values())}
+
+        # Nachrichtenverlauf pro Nutzer (meiste Nachrichten zuerst)
+        weeks = list(analyzer.msg_count_by("week").keys())
+        user_weeks = sorted(((user.username, list(counts.values()))
+                             for user, counts in analyzer.user_msg_count_by("week").items()),
+                            key=lambda item: sum(item[1]), reverse=True)
+
+        return {
+            "colors": chartdata.NICECOLORS,
+            "charts": [
+                user_chart("msg_per_user", "pie", analyzer.user_msg_count()),
+                user_chart("media_per_user", "pie", analyzer.user_count_media(sum_only=True)),
+                user_chart("conv_start", "pie", analyzer.user_start_conversation(),
+                           label_func=lambda s: f"{s}%"),
+                user_chart("msg_len_per_user", "bar", analyzer.user_avg_word_count()),
+                bucket_chart("msg_by_weekday", analyzer.msg_count_by("weekday"),
+                             lambda day: WEEKDAY_NAMES[day]),
+                bucket_chart("msg_by_hour", analyzer.msg_count_by("hour")),
+                bucket_chart("msg_per_week", analyzer.msg_count_by("week"),
+                             lambda week: week.strftime("%d.%m.%Y")),
+                {"id": "msg_per_person_per_week", "type": "line",
+                 "labels": [week.strftime("%d.%m.%Y") for week in weeks],
+                 "series": [{"name": f"{username} - ({sum(counts)} Total)", "values": counts}
+                            for username, counts in user_weeks]},
+            ]}
+
+    @profiled
+    def results(self) -> dict:
+        '''Return die Ergebnisse aller Analyzer Metriken als JSON kompatibles
+           Dictionary (Nutzernamen statt User Objekten, Daten als ISO Text,
+           None statt NaN, siehe serialize.to_json)'''
+        analyzer = self._analyzer
+        first_message, last_message = analyzer.chat_span()
+
+        def by_user(d):
+            return {user.username: value for user, value in d.items()}
+
+        return to_json({
+            "chat": self._chatname_base,
+            "users": analyzer.manager.usernames,
+            "total_msg_count": analyzer.total_msg_count(),
+            "first_message": first_message,
+            "last_message": last_message,
+            "chat_avg_msg_per_day": analyzer.chat_avg_msg_per_day(),
+            "most_common_links": analyzer.most_common_links(),
+            "user_msg_count": by_user(analyzer.user_msg_count()),
+            "user_avg_word_count": by_user(analyzer.user_avg_word_count()),
+            "user_most_common_words": by_user(analyzer.user_most_common_words()),
+            "user_most_common_emojis": by_user(analyzer.user_most_common_emojis()),
+            "user_count_media": by_user(analyzer.user_count_media()),
+            "user_start_conversation": by_user(analyzer.user_start_conversation()),
+            "user_sessions": by_user(analyzer.user_sessions()),
+            "user_reply_latency": by_user(analyzer.user_reply_latency()),
+            "reply_matrix": {replier.username: by_user(row)
+                             for replier, row in analyzer.reply_matrix().items()},
+            "msg_count_by_hour": analyzer.msg_count_by("hour"),
+            "msg_count_by_weekday": {WEEKDAY_NAMES[day]: count for day, count
+                                     in analyzer.msg_count_by("weekday").items()},
+            "msg_count_by_week": {week.isoformat(): count for week, count
+                                  in analyzer.msg_count_by("week").items()},
+        })
+
+    @profiled
+    def export_json(self, filepath: str = None) -> str:
+        '''Speichert results() als JSON (Standard: results_path)
+           Return den Pfad der Datei'''
+        filepath = filepath or self.results_path
+        with open(filepath, "w", encoding="utf-8") as f:
+            # allow_nan=False: NaN wäre ungültiges JSON und soll sofort auffallen
+            json.dump(self.results(), f, ensure_ascii=False, indent=2, allow_nan=False)
+        return filepath
+
+    @profiled
+    def create_html_report(self, interactive: bool = False, recent: bool = True):
+        '''Schreibt den HTML Report
+           interactive: falls True werden statt der PNG Graphen nur die Daten als JSON
+                        eingebettet und die Diagramme im Browser gezeichnet (offline)
+           recent: falls True wird der Report zusätzlich als recent_report.html gespeichert'''
+        if interactive:
+            cards = "".join(self._html_card(f'            <div id="{chart_id}" class="card-img-top"></div>', title)
+                            for chart_id, title in REPORT_CARDS)
+            # "</" darf im Skript nicht vorkommen, sonst endet der script Tag
+            data = json.dumps(self._report_data(), ensure_ascii=False,
+                              separators=(",", ":")).replace("</", "<\\/")
+            with open(path.join(path.dirname(path.realpath(__file__)), "report_charts.js"),
+                      "r", encoding="utf-8") as f:
+                charts_js = f.read()
+            scripts = f"    <script>window.REPORT_DATA = {data};</script>\n    <script>\n{charts_js}    </script>"
+        else:
+            cards = "".join(self._html_card(f'''            <img
               class="card-img-top img-fluid"
-              src="{path.join(self._rel_chat_plot_dir, "msg_per_person_per_week.png")}"
-              alt="msg_per_person_per_week"
-            />
-            <div class="card-block">
-              <h2 class="card-title">Nachrichten pro Woche pro Nutzer</h2>
-            </div>
-          </div>
-        </div>
+              src="{path.join(self._rel_chat_plot_dir, f"{chart_id}.png")}"
+              alt="{chart_id}"
+            />''', title) for chart_id, title in REPORT_CARDS)
+            scripts = ""
+        html_str = self._html_page(cards, scripts)
 
-      </div>
-    </div>
-  </body>
-</html>
-
-'''
         # Report im Reportordner speichern
-        report_path = path.join(
-            self._project_basedir, "reports", f"{self._chatname_base}_report.html")
-        with open(report_path, "w") as f:
+        with open(self.report_path, "w", encoding="utf-8") as f:
             f.write(html_str)
 
+        if not recent:
+            return
+
         # aktuellen Report im Rootverzeichnis speichern
         recent_report_path = path.join(
             self._project_basedir, f"recent_report.html")
-        with open(recent_report_path, "w") as f:
+        with open(recent_report_path, "w", encoding="utf-8") as f:
             f.write(html_str)
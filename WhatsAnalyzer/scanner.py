@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left
+import mmap
+import re
+from os import path
+
+import globals_
+
+LTR_MARK = u"\u200e".encode("utf-8")
+
+# \s trifft im str Modus auch Unicode Leerzeichen, im bytes Modus nur ASCII
+# -> geschützte / schmale Leerzeichen als UTF-8 Bytes ergänzen
+BYTES_WHITESPACE = rb"(?:[ \t]|\xc2\xa0|\xe2\x80[\x80-\x8a\xaf]|\xe3\x80\x80)"
+
+
+def date_regex_bytes(os: str):
+    '''Return das Datumsmuster des Betriebssystems als bytes Regex,
+       das am Anfang jeder Zeile (auch hinter LTR Marks) sucht'''
+    pattern = getattr(globals_, f"DATEPATTERN_{os}").lstrip("^")
+    pattern = pattern.encode("ascii").replace(rb"\s", BYTES_WHITESPACE)
+    return re.compile(rb"(?m)^(?:" + re.escape(LTR_MARK) + rb")*" + pattern)
+
+
+class ChatScanner:
+    '''Liest eine Chatdatei per Memory Mapping und merkt sich nur die
+       Startpositionen (in Bytes) aller Nachrichten. Dekodiert wird erst,
+       wenn eine Nachricht tatsächlich gebraucht wird.
+       Nachrichtengrenzen werden nur an "\\n" erkannt (nicht an Unicode
+       Zeilentrennern wie U+2028).
+       start / end: falls angegeben, wird nur dieser Bytebereich gelesen
+                    (start muss auf einer Nachrichtengrenze liegen)'''
+
+    def __init__(self, filepath: str, os: str,
+                 start: int = None, end: int = None) -> None:
+        self._filepath = filepath
+        self._os = os
+        self._file = open(filepath, "rb")
+        self._buffer = self._init_buffer()
+        self._start = start
+        self._end = len(self._buffer) if end is None else end
+        self._offsets = self._init_offsets()
+
+    def _init_buffer(self):
+        # leere Dateien können nicht gemappt werden
+        if path.getsize(self._filepath) == 0:
+            return b""
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _init_offsets(self) -> array:
+        '''Return Array mit den Startpositionen aller Nachrichten'''
+        buf = self._buffer
+
+        start = self._start
+        if start is None:
+            # erste Zeile (WA Info) überspringen
+            header_end = buf.find(b"\n")
+            start = len(buf) if header_end == -1 else header_end + 1
+
+        offsets = array("Q")
+        for match in date_regex_bytes(self._os).finditer(buf, start):
+            if match.start() >= self._end:
+                break
+            offsets.append(match.start())
+        return offsets
+
+    @property
+    def offsets(self) -> array:
+        '''Return Startpositionen aller Nachrichten in Bytes'''
+        return self._offsets
+
+    @property
+    def size(self) -> int:
+        '''Return Größe der Datei in Bytes'''
+        return len(self._buffer)
+
+    def starts_cleanly(self) -> bool:
+        '''Return True, falls der gelesene Bereich direkt mit einer neuen Nachricht
+           beginnt, die Nachricht davor also nicht verändert wird'''
+        if self._start is None or len(self._offsets) == 0:
+            return self._start is None
+        gap = self._buffer[self._start:self._offsets[0]]
+        if gap == b"":
+            return True
+        # Datei endete vorher ohne Zeilenumbruch -> genau ein Umbruch ist erlaubt
+        before = self._buffer[self._start - 1:self._start]
+        return gap in (b"\n", b"\r\n") and before not in (b"\n", b"\r")
+
+    def line_count(self) -> int:
+        '''Return Anzahl der Zeilen aller gelesenen Nachrichten
+           (inkl. Folgezeilen, ohne die Zeilen vor der ersten Nachricht)'''
+        if len(self._offsets) == 0:
+            return 0
+        # mmap hat kein count() -> blockweise zählen, ohne die ganze Datei zu kopieren
+        block = 16 * 1024 * 1024
+        lines = sum(self._buffer[pos:min(pos + block, self._end)].count(b"\n")
+                    for pos in range(self._offsets[0], self._end, block))
+        if self._buffer[self._end - 1:self._end] != b"\n":
+            lines += 1  # letzte Zeile ohne Zeilenumbruch
+        return lines
+
+    def chunk_spans(self, n: int) -> list:
+        '''Return bis zu n Bytebereiche [(start, ende), ...], deren Grenzen
+           jeweils auf den nächsten Nachrichtenanfang verschoben wurden'''
+        if len(self._offsets) == 0:
+            return []
+
+        first, end = self._offsets[0], self._end
+        chunk_size = (end - first) / n
+        bounds = [first]
+        for k in range(1, n):
+            # Schnittstelle auf die nächste Nachrichtengrenze schieben
+            i = bisect_left(self._offsets, first + int(k * chunk_size))
+            if i < len(self._offsets) and self._offsets[i] > bounds[-1]:
+                bounds.append(self._offsets[i])
+        bounds.append(end)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.message_string(i)
+
+    def span(self, i: int) -> tuple:
+        '''Return (start, ende) der i-ten Nachricht in Bytes'''
+        start = self._offsets[i]
+        end = self._offsets[i + 1] if i + 1 < len(self._offsets) else self._end
+        return start, end
+
+    def raw(self, i: int) -> memoryview:
+        '''Return die i-te Nachricht ohne Kopie als memoryview auf die Datei
+           (inkl. Zeilenumbrüche und LTR Marks)'''
+        start, end = self.span(i)
+        return memoryview(self._buffer)[start:end]
+
+    def message_string(self, i: int) -> str:
+        '''Return die i-te Nachricht als eine Zeile
+           (LTR Marks entfernt, Folgezeilen mit Leerzeichen angehängt)'''
+        start, end = self.span(i)
+        text = self._buffer[start:end].replace(LTR_MARK, b"").decode("utf-8")
+        return " ".join(text.splitlines())
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+import math
+
+import numpy as np
+
+from message import Message
+from user import User
+
+
+def to_json(value):
+    '''Return value mit Nutzernamen statt User Objekten, Daten als ISO Text,
+       Python Zahlen statt numpy Werten und None statt NaN (z.B. Antwortzeiten
+       ohne Antworten), damit json.dumps(..., allow_nan=False) gültiges JSON schreibt'''
+    if isinstance(value, dict):
+        return {_json_key(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return to_json(value.tolist())
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, User):
+        return value.username
+    if isinstance(value, Message):
+        return {"dateandtime": value.dateandtime.isoformat(),
+                "username": value.username,
+                "body": value.body}
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _json_key(key):
+    if isinstance(key, User):
+        return key.username
+    if isinstance(key, date):
+        return key.isoformat()
+    if isinstance(key, np.generic):
+        return key.item()
+    return key
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+from os import path
+import threading
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from batch import find_chats
+from reporter import Reporter
+from serialize import to_json
+
+# geschätzter Speicher pro Nachricht inklusive Zwischenergebnissen, Rankings ohne
+# Filter und Plotter DataFrame (gemessen mit tracemalloc). Ergebnisse für Filter und
+# Suchanfragen zählt der Analyzer selbst (memo_stats()["query_bytes"], begrenzt
+# auf analyzer.MEMO_MAX_BYTES pro Chat)
+MESSAGE_BYTES = 1200
+
+# Analyzer Methoden, die der Server anbietet (Parameter kommen aus dem Query String)
+METRICS = ("user_msg_count", "total_msg_count", "user_avg_word_count", "chat_avg_msg_per_day",
+           "msg_count_by", "user_msg_count_by", "most_common_links", "user_most_common_words",
+           "user_start_conversation", "user_sessions", "user_reply_latency", "reply_matrix",
+           "user_most_common_emojis", "user_count_media", "search", "user_term_count",
+           "term_over_time")
+
+# matplotlib ist nicht threadsicher, Graphen werden nacheinander gezeichnet
+_render_lock = threading.Lock()
+
+
+def _parse_value(text: str):
+    '''Return den Wert eines Query Parameters ("5" -> 5, "true" -> True,
+       "[25, 50]" -> [25, 50], alles andere bleibt Text)'''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class ChatPool:
+    '''Hält Reporter (mit Analyzer, Zwischenergebnissen und Plotter) für mehrere
+       Chats im Speicher, damit nicht jede Anfrage den Chat neu einliest.
+       max_mb: obere Grenze für den geschätzten Speicher (MESSAGE_BYTES pro Nachricht
+               plus gespeicherte Ergebnisse für Filter und Suchanfragen), darüber fliegen
+               die am längsten nicht benutzten Chats raus (LRU)
+       Ändert sich eine Chatdatei (mtime / Größe), wird sie beim nächsten Zugriff
+       neu eingelesen, mit Cache wird dabei nur das neue Ende geparst.'''
+
+    def __init__(self, chat_dir: str, max_mb: float = 1024, workers: int = 1,
+                 use_cache: bool = True) -> None:
+        self._chat_dir = chat_dir
+        self._max_bytes = max_mb * 1024 ** 2
+        self._workers = workers
+        self._use_cache = use_cache
+        self._entries = OrderedDict()  # Chatname -> {"reporter", "stat", "size" (ohne Memo)}
+        self._lock = threading.Lock()  # schützt _entries, _loading und _stats
+        self._loading = {}  # Chatname -> Lock, damit jeder Chat nur einmal geparst wird
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0}
+
+    def chats(self) -> list:
+        '''Return die Namen aller Chats im Chatordner (ohne ".txt")'''
+        return [path.splitext(path.basename(filepath))[0]
+                for filepath in find_chats(self._chat_dir)]
+
+    def filepath(self, chatname: str) -> str:
+        '''Return den Pfad der Chatdatei (nur Chats aus dem Chatordner)'''
+        if chatname not in self.chats():
+            raise FileNotFoundError(f"Den Chat '{chatname}' gibt es nicht.")
+        return path.join(self._chat_dir, f"{chatname}.txt")
+
+    def _stat(self, filepath: str) -> tuple:
+        stat = os.stat(filepath)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, chatname: str) -> Reporter:
+        '''Return den Reporter des Chats (lädt ihn bei Bedarf bzw. nach Änderungen neu)'''
+        filepath = self.filepath(chatname)
+        with self._lock:
+            entry = self._entries.get(chatname)
+            load_lock = self._loading.setdefault(chatname, threading.Lock())
+
+        if entry is not None and entry["stat"] == self._stat(filepath):
+            with self._lock:
+                self._stats["hits"] += 1
+                if chatname in self._entries:
+                    self._entries.move_to_end(chatname)
+                # die Ergebnisse der letzten Anfragen haben den Speicher wachsen lassen
+                self._evict()
+            return entry["reporter"]
+
+        with load_lock:
+            # vielleicht hat ein anderer Thread den Chat inzwischen geladen
+            with self._lock:
+                entry = self._entries.get(chatname)
+            stat = self._stat(filepath)
+            if entry is not None and entry["stat"] == stat:
+                with self._lock:
+                    self._stats["hits"] += 1
+                return entry["reporter"]
+
+            # neuer Reporter statt ChatManager.reload(), damit laufende Anfragen
+            # bis zum Austausch mit dem alten Stand weiterarbeiten können
+            reporter = Reporter(filepath, workers=self._workers, use_cache=self._use_cache)
+            size = reporter.analyzer.total_msg_count() * MESSAGE_BYTES
+            with self._lock:
+                self._stats["reloads" if entry is not None else "misses"] += 1
+                self._entries[chatname] = {"reporter": reporter, "stat": stat, "size": size}
+                self._entries.move_to_end(chatname)
+                self._evict()
+            return reporter
+
+    def _evict(self) -> None:
+        '''Entfernt die am längsten nicht benutzten Chats, bis die Grenze
+           eingehalten wird (der zuletzt benutzte Chat bleibt immer)'''
+        while len(self._entries) > 1 and self.size > self._max_bytes:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    @staticmethod
+    def _entry_size(entry: dict) -> int:
+        '''Return geschätzten Speicher eines Chats: Nachrichten plus die Ergebnisse
+           für Filter / Suchanfragen, die der Analyzer seitdem gespeichert hat'''
+        return entry["size"] + entry["reporter"].analyzer.memo_stats()["query_bytes"]
+
+    @property
+    def size(self) -> int:
+        '''Return den geschätzten Speicher aller geladenen Chats in Bytes'''
+        return sum(self._entry_size(entry) for entry in self._entries.values())
+
+    def stats(self) -> dict:
+        '''Return Trefferzahlen, geladene Chats und geschätzten Speicher (MB)'''
+        with self._lock:
+            return {**self._stats,
+                    "loaded": list(self._entries),
+                    "size_mb": self.size / 1024 ** 2,
+                    "max_mb": self._max_bytes / 1024 ** 2}
+
+
+class AnalyzerHandler(BaseHTTPRequestHandler):
+    '''Beantwortet GET Anfragen:
+       /                                 Chats und Statistik des ChatPools
+       /chats/<chat>                     alle Ergebnisse (wie Reporter.results)
+       /chats/<chat>/<metric>?n=10&...   eine Analyzer Metrik als JSON
+       /chats/<chat>/plots/<graph>.png   ein Graph des Reports als PNG'''
+
+    pool = None  # ChatPool, wird in serve() gesetzt
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        params = {key: _parse_value(value) for key, value in parse_qsl(url.query)}
+        try:
+            if not parts:
+                self._send_json({"chats": self.pool.chats(), "pool": self.pool.stats()})
+            elif parts[0] == "chats" and len(parts) == 2:
+                self._send_json(self.pool.get(parts[1]).results())
+            elif parts[0] == "chats" and len(parts) == 3 and parts[2] in METRICS:
+                analyzer = self.pool.get(parts[1]).analyzer
+                self._send_json(to_json(getattr(analyzer, parts[2])(**params)))
+            elif parts[0] == "chats" and len(parts) == 4 and parts[2] == "plots" \
+                    and parts[3].endswith(".png"):
+                self._send_png(self.pool.get(parts[1]), parts[3][:-len(".png")])
+            else:
+                self._send_json({"error": f"Unbekannte Adresse {url.path}"}, 404)
+        except FileNotFoundError as e:
+            self._send_json({"error": str(e)}, 404)
+        except (TypeError, ValueError) as e:
+            # falsche Parameter, z.B. ?by=month
+            self._send_json({"error": str(e)}, 400)
+        except Exception as e:
+            self._send_json({"error": f"{type(e).__name__}: {e}"}, 500)
+
+    def _send_json(self, data, status: int = 200) -> None:
+        # NaN ist kein gültiges JSON (JSON.parse im Browser lehnt es ab), to_json macht None daraus
+        body = json.dumps(data, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        self._send(body, "application/json; charset=utf-8", status)
+
+    def _send_png(self, reporter: Reporter, name: str) -> None:
+        import render
+
+        buffer = io.BytesIO()
+        # auch die Daten im Lock berechnen: der erste Graph baut den Plotter,
+        # der die globalen matplotlib Einstellungen setzt
+        with _render_lock:
+            (job,) = reporter.graph_jobs([name])
+            render.render_figure(job[:3] + (buffer,))
+        self._send(buffer.getvalue(), "image/png")
+
+    def _send(self, body: bytes, content_type: str, status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8050, max_mb: float = 1024,
+          workers: int = 1, use_cache: bool = True) -> None:
+    '''Startet den Server für alle Chats im "chats" Ordner des Projekts
+       (jede Anfrage in einem eigenen Thread, bis Strg+C)'''
+    import render
+
+    # Aussehen der Graphen einmal vor allen Anfragen setzen
+    render.apply_style()
+    project_basedir = path.dirname(os.getcwd())  # Projekt Root
+    AnalyzerHandler.pool = ChatPool(path.join(project_basedir, "chats"), max_mb,
+                                    workers, use_cache)
+    with ThreadingHTTPServer((host, port), AnalyzerHandler) as server:
+        print(f"WhatsAnalyzer Server läuft auf http://{host}:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Server, der Chats im Speicher hält und Ergebnisse als JSON / PNG liefert")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="Adresse (Standard: nur lokal erreichbar)")
+    parser.add_argument("-p", "--port", type=int, default=8050)
+    parser.add_argument("-m", "--max-mb", type=float, default=1024,
+                        help="geschätzter Speicher für geladene Chats, danach werden die am "
+                             "längsten nicht benutzten entfernt")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Anzahl der Prozesse zum Einlesen eines Chats (0 = alle Kerne)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Chats neu parsen, ohne den Cache zu benutzen oder zu füllen")
+    args = parser.parse_args()
+
+    os.chdir(path.dirname(path.realpath(__file__)))
+    serve(args.host, args.port, args.max_mb, args.workers, not args.no_cache)
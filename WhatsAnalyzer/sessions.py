@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def session_starts(timestamps: np.ndarray, gap: float = None) -> np.ndarray:
+    '''Return Maske, welche Nachrichten eine neue Unterhaltung beginnen
+       gap: None -> erste Nachricht jedes Kalendertages,
+            sonst neue Unterhaltung nach mehr als gap Minuten Stille'''
+    starts = np.ones(len(timestamps), dtype=bool)
+    if gap is None:
+        days = timestamps // SECONDS_PER_DAY
+        starts[1:] = days[1:] != days[:-1]
+    else:
+        starts[1:] = np.diff(timestamps) > gap * 60
+    return starts
+
+
+def sessions(timestamps: np.ndarray, user_codes: np.ndarray,
+             user_count: int, gap: float = None) -> dict:
+    '''Teilt den Chat in einem Durchlauf in Unterhaltungen auf
+       Return {"starts": Anzahl gestarteter Unterhaltungen pro Nutzernummer,
+               "starters": Nutzernummer, die die Unterhaltung gestartet hat,
+               "sizes": Anzahl Nachrichten pro Unterhaltung,
+               "lengths": Dauer jeder Unterhaltung in Minuten}'''
+    start_idx = np.flatnonzero(session_starts(timestamps, gap))
+    # letzte Nachricht jeder Unterhaltung (leer, falls es keine Nachrichten gibt)
+    end_idx = np.append(start_idx[1:], len(timestamps))[:len(start_idx)] - 1
+
+    starters = user_codes[start_idx]
+    return {"starts": np.bincount(starters, minlength=user_count),
+            "starters": starters,
+            "sizes": end_idx - start_idx + 1,
+            "lengths": (timestamps[end_idx] - timestamps[start_idx]) / 60}
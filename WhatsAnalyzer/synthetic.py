@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import random
+
+LTR_MARK = u"\u200e"
+
+HEADER = {"IOS": f"{LTR_MARK}[01.01.19, 00:00:00] Chat: Nachrichten und Anrufe sind Ende-zu-Ende-verschlüsselt.",
+          "ANDROID": "01.01.19, 00:00 - Nachrichten und Anrufe sind Ende-zu-Ende-verschlüsselt."}
+TIMESTAMP = {"IOS": "[%d.%m.%y, %H:%M:%S]", "ANDROID": "%d.%m.%y, %H:%M"}
+SEPARATOR = {"IOS": " ", "ANDROID": " - "}
+
+NAMES = ["Anna", "Bernd", "Carla", "Dennis", "Emma", "Felix", "Greta", "Hannes",
+         "Ida", "Jonas", "Klara", "Lukas", "Mia", "Noah", "Olivia", "Paul"]
+WORDS = ["hallo", "heute", "morgen", "abend", "kino", "essen", "pizza", "arbeit",
+         "schule", "urlaub", "wetter", "sonne", "regen", "see", "fahrrad", "zug",
+         "katze", "hund", "film", "serie", "buch", "musik", "konzert", "party",
+         "geburtstag", "kuchen", "kaffee", "bier", "wein", "spiel", "training",
+         "müde", "glücklich", "super", "cool", "genau", "vielleicht", "später",
+         "ich", "du", "wir", "ihr", "und", "oder", "aber", "nicht", "auch", "noch",
+         "schon", "mal", "doch", "ja", "nein", "ok", "der", "die", "das", "ein",
+         "eine", "ist", "bin", "hast", "habe", "kommst", "gehen", "machen", "sehen"]
+EMOJIS = ["😀", "😂", "🙈", "👍", "👍🏽", "❤", "❤️", "✨", "🎉", "🍕",
+          "🇩🇪", "👨‍👩‍👧", "1️⃣", "🤷‍♀️", "😍"]
+SITES = ["www.youtube.com", "www.spiegel.de", "open.spotify.com", "www.instagram.com",
+         "maps.google.com", "github.com", "www.wikipedia.org"]
+MEDIA_IOS = ["Bild", "Video", "Audio", "Sticker", "GIF", "Dokument"]
+MEDIA_ANDROID = "<Medien ausgeschlossen>"
+
+
+class ChatGenerator:
+    '''Erzeugt zufällige, aber reproduzierbare Chatexporte im Format von
+       WhatsApp für iOS oder Android (für Benchmarks und zum Testen).
+       Enthält mehrzeilige Nachrichten, Medien, Emojis, Links, LTR Marks
+       und Systemnachrichten ohne Nutzernamen.'''
+
+    def __init__(self, os: str = "IOS", users: int = 5, seed: int = 0,
+                 start: datetime = datetime(2019, 1, 1)) -> None:
+        self._os = os.upper()
+        self._random = random.Random(seed)
+        self._users = [NAMES[i % len(NAMES)] + (f" {i // len(NAMES) + 1}" if i >= len(NAMES) else "")
+                       for i in range(users)]
+        # manche Nutzer schreiben deutlich mehr als andere
+        self._weights = [1 / (i + 1) for i in range(users)]
+        self._time = start
+
+    def _next_time(self) -> datetime:
+        '''Meist kurze Abstände, ab und zu lange Pausen (neue Unterhaltung)'''
+        if self._random.random() < 0.05:
+            gap = self._random.expovariate(1 / (8 * 60 * 60))
+        else:
+            gap = self._random.expovariate(1 / 90)
+        self._time += timedelta(seconds=int(gap) + 1)
+        return self._time
+
+    def _text(self) -> str:
+        rnd = self._random
+        words = rnd.choices(WORDS, k=rnd.randint(1, 20))
+        r = rnd.random()
+        if r < 0.15:
+            words.insert(rnd.randrange(len(words) + 1),
+                         "".join(rnd.choices(EMOJIS, k=rnd.randint(1, 3))))
+        elif r < 0.2:
+            words.append(f"https://{rnd.choice(SITES)}/{rnd.randrange(10 ** 6)}")
+        text = " ".join(words)
+        return text[0].upper() + text[1:]
+
+    def _body(self) -> str:
+        rnd = self._random
+        r = rnd.random()
+        if r < 0.08:
+            if self._os == "IOS":
+                return f"{LTR_MARK}{rnd.choice(MEDIA_IOS)} weggelassen"
+            return MEDIA_ANDROID
+        body = self._text()
+        if r < 0.13:
+            # mehrzeilige Nachricht, teilweise mit Leerzeilen
+            lines = [self._text() for _ in range(rnd.randint(1, 3))]
+            if rnd.random() < 0.3:
+                lines.insert(0, "")
+            body += "\n" + "\n".join(lines)
+        return body
+
+    def lines(self, messages: int):
+        '''Gibt die Zeilen eines Chats mit messages Nachrichten nacheinander zurück'''
+        rnd = self._random
+        timestamp_format = TIMESTAMP[self._os]
+        separator = SEPARATOR[self._os]
+        yield HEADER[self._os]
+        for _ in range(messages):
+            timestamp = self._next_time().strftime(timestamp_format)
+            user = rnd.choices(self._users, self._weights)[0]
+            if rnd.random() < 0.005:
+                # Systemnachricht ohne "Nutzer:" (wird beim Parsen verworfen)
+                yield f"{LTR_MARK}{timestamp}{separator}{user} hat die Gruppenbeschreibung geändert."
+                continue
+            prefix = LTR_MARK if self._os == "IOS" and rnd.random() < 0.1 else ""
+            yield f"{prefix}{timestamp}{separator}{user}: {self._body()}"
+
+    def write(self, filepath: str, messages: int) -> None:
+        '''Schreibt einen Chat mit messages Nachrichten nach filepath'''
+        with open(filepath, "w", encoding="utf-8", newline="\n") as f:
+            block = []
+            for line in self.lines(messages):
+                block.append(line)
+                if len(block) >= 10000:
+                    f.write("\n".join(block) + "\n")
+                    block = []
+            if block:
+                f.write("\n".join(block) + "\n")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Erzeugt einen zufälligen WhatsApp Chatexport")
+    parser.add_argument("filepath", help="Pfad der neuen Chatdatei", type=str)
+    parser.add_argument("--os", choices=["ios", "android"], default="ios")
+    parser.add_argument("-n", "--messages", type=int, default=10000)
+    parser.add_argument("-u", "--users", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ChatGenerator(args.os, users=args.users, seed=args.seed).write(args.filepath, args.messages)
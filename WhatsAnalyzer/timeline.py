@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from sessions import SECONDS_PER_DAY
+
+SECONDS_PER_HOUR = 60 * 60
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH_WEEKDAY = 3  # der 01.01.1970 war ein Donnerstag (0 = Montag)
+WEEKDAY_NAMES = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
+
+
+def bucket_ids(timestamps: np.ndarray, by: str) -> tuple:
+    '''Return (Nummer des Zeitabschnitts jeder Nachricht, Schlüssel der Abschnitte)
+       by: "hour" (0-23), "weekday" (0 = Montag) oder
+           "week" (Datum des Sonntags am Ende der Woche, wie resample("W"))'''
+    if by == "hour":
+        return (timestamps % SECONDS_PER_DAY) // SECONDS_PER_HOUR, list(range(24))
+
+    days = timestamps // SECONDS_PER_DAY
+    weekdays = (days + EPOCH_WEEKDAY) % 7
+    if by == "weekday":
+        return weekdays, list(range(7))
+
+    if by == "week":
+        if len(days) == 0:
+            return days, []
+        week_ends = days + 6 - weekdays
+        first = int(week_ends.min())
+        ids = (week_ends - first) // 7
+        return ids, [EPOCH_DATE + timedelta(days=first + 7 * i)
+                     for i in range(int(ids.max()) + 1)]
+
+    raise ValueError(by)
+
+
+def bucket_counts(timestamps: np.ndarray, user_codes: np.ndarray,
+                  user_count: int, by: str) -> tuple:
+    '''Return (Schlüssel der Abschnitte, Matrix [Nutzernummer, Abschnitt] mit der
+       Anzahl der Nachrichten), alle Abschnitte in einem bincount'''
+    ids, keys = bucket_ids(timestamps, by)
+    flat = user_codes.astype(np.int64) * len(keys) + ids
+    counts = np.bincount(flat, minlength=user_count * len(keys))
+    return keys, counts.reshape(user_count, len(keys))
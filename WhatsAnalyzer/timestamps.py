@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from functools import lru_cache
+
+import globals_
+
+DATEPARSE = {"IOS": globals_.DATEPARSE_IOS,
+             "ANDROID": globals_.DATEPARSE_ANDROID}
+
+# Zeitstempel werden als Sekunden seit EPOCH gespeichert (ohne Zeitzone)
+EPOCH = datetime(1970, 1, 1)
+
+# Position der Datumsteile im festen Format
+# IOS: "[dd.mm.yy, HH:MM:SS]"  ANDROID: "dd.mm.yy, HH:MM"
+LAYOUT = {"IOS": (1, 20), "ANDROID": (0, 15)}
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(date_str: str) -> tuple:
+    '''Return (Jahr, Monat, Tag) für "dd.mm.yy"
+       (viele Nachrichten teilen sich denselben Tag)'''
+    if date_str[2] != "." or date_str[5] != ".":
+        raise ValueError(date_str)
+    year = int(date_str[6:8])
+    # wie %y bei strptime: 69-99 -> 19xx, 00-68 -> 20xx
+    year += 1900 if year >= 69 else 2000
+    return year, int(date_str[3:5]), int(date_str[0:2])
+
+
+def _parse_fast(text: str, os: str) -> datetime:
+    start, length = LAYOUT[os]
+    if len(text) != length or text[start + 8] != ",":
+        raise ValueError(text)
+
+    year, month, day = _parse_date(text[start:start + 8])
+    t = start + 10  # Beginn der Uhrzeit "HH:MM"
+    if text[t + 2] != ":":
+        raise ValueError(text)
+    hour, minute = int(text[t:t + 2]), int(text[t + 3:t + 5])
+
+    second = 0
+    if os == "IOS":
+        if text[0] != "[" or text[t + 5] != ":" or text[-1] != "]":
+            raise ValueError(text)
+        second = int(text[t + 6:t + 8])
+
+    return datetime(year, month, day, hour, minute, second)
+
+
+def parse_dateandtime(text: str, os: str) -> datetime:
+    '''Return datetime Objekt für den Zeitstempel einer Nachricht.
+       Das feste Format wird direkt aus den Ziffern gelesen, alles andere
+       geht wie bisher über datetime.strptime (gleiche Ergebnisse / Fehler)'''
+    try:
+        return _parse_fast(text, os)
+    except ValueError:
+        return datetime.strptime(text, DATEPARSE[os])
+
+
+def to_seconds(dateandtime: datetime) -> int:
+    '''Return Sekunden seit EPOCH'''
+    return int((dateandtime - EPOCH).total_seconds())
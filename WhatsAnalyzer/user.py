@@ -3,10 +3,14 @@
 class User():
     def __init__(self, username: str, userrows: list) -> None:
         self._username = username  # Chatname des Nutzers
-        self._userrows = userrows  # nur die Zeilen, in denen der Nutzer etwas schreibt
+        # nur die Zeilen, in denen der Nutzer etwas schreibt
+        # (oder eine Funktion, die sie beim ersten Zugriff liefert)
+        self._userrows = userrows
 
     @property
     def userrows(self) -> list:
+        if callable(self._userrows):
+            self._userrows = self._userrows()
         return self._userrows
 
     @property
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+
+
+class Vocabulary:
+    '''Ordnet jedem Wort eine feste Zahl (id) zu, damit Worte nur einmal
+       gespeichert und mit numpy gezählt werden können.
+       Die stopwords bekommen die ersten ids (0 bis stopword_count - 1).'''
+
+    def __init__(self, stopwords=()) -> None:
+        self._ids = {}  # Wort -> id
+        self._words = []  # id -> Wort
+        for word in sorted(set(stopwords)):
+            self.add(word)
+        self._stopword_count = len(self._words)
+
+    def add(self, word: str) -> int:
+        '''Return die id des Wortes (neue Worte werden hinten angefügt)'''
+        token_id = self._ids.get(word)
+        if token_id is None:
+            token_id = len(self._words)
+            self._ids[word] = token_id
+            self._words.append(word)
+        return token_id
+
+    def encode(self, words: list) -> array:
+        '''Return die ids der Worte als kompaktes Array'''
+        ids = self._ids
+        return array("I", [ids[w] if w in ids else self.add(w) for w in words])
+
+    def decode(self, token_ids) -> list:
+        '''Return die Worte zu den ids'''
+        return [self._words[token_id] for token_id in token_ids]
+
+    def word(self, token_id: int) -> str:
+        return self._words[token_id]
+
+    def id(self, word: str) -> int:
+        '''Return die id des Wortes oder None, falls es nicht vorkommt'''
+        return self._ids.get(word)
+
+    @property
+    def stopword_count(self) -> int:
+        '''Return Anzahl der stopwords (ids darunter sind stopwords)'''
+        return self._stopword_count
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._ids
@@ -17,9 +17,12 @@ FIX
 
 from analyzer import Analyzer
 from argparse import ArgumentParser
+from batch import run_batch
+from profiling import PROFILER
 from reporter import Reporter
 import os
 from os import path
+import sys
 
 
 '''
@@ -52,14 +55,67 @@ def pretty_print(result: dict) -> None:
         print(result)
 
 
-if __name__ == "__main__":
-    os.chdir(path.dirname(path.realpath(__file__)))
+def finish_profile(filepath: str) -> None:
+    '''Gibt die Messwerte von --profile aus und speichert sie als JSON'''
+    if not PROFILER.enabled:
+        return
+    PROFILER.disable()
+    print(PROFILER.format_summary())
+    PROFILER.write(filepath)
+    print(f"Profil gespeichert unter {filepath}")
+
 
+if __name__ == "__main__":
     parser = ArgumentParser("Tool zum Analysieren von WhatsApp Chats")
-    parser.add_argument("chatname", help="Name der Chat Datei", type=str)
+    parser.add_argument("chatname", help="Name der Chat Datei (mit --batch: Ordner oder Glob Muster)",
+                        type=str)
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Anzahl der Prozesse zum Einlesen des Chats und Zeichnen der Graphen, "
+                             "mit --batch Anzahl gleichzeitig bearbeiteter Chats (0 = alle Kerne, "
+                             "Standard: 1 bzw. alle Kerne mit --batch)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Chat neu parsen, ohne den Cache zu benutzen oder zu füllen")
+    parser.add_argument("-i", "--interactive", action="store_true",
+                        help="Diagramme im Browser zeichnen statt PNG Graphen zu erzeugen")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="keine Graphen und kein HTML Report, nur Konsolenausgabe und alle "
+                             "Ergebnisse als JSON im Reportordner (startet ohne pandas / matplotlib)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Reports für alle Chats im Ordner / Glob Muster erstellen (ein Chat pro Prozess)")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        metavar="JSON",
+                        help="Laufzeit und Speicherspitze aller Stufen messen, ausgeben und als "
+                             "JSON speichern (Standard: profile.json, Worker Prozesse zählen nicht mit)")
     args = parser.parse_args()
 
+    # Ordner / Glob Muster relativ zum Aufrufverzeichnis auflösen
+    pattern = path.abspath(args.chatname)
+    profile_path = path.abspath(args.profile) if args.profile else None
+    os.chdir(path.dirname(path.realpath(__file__)))
+
+    if profile_path is not None:
+        PROFILER.enable()
+
+    if args.batch:
+        workers = 0 if args.workers is None else args.workers
+        with PROFILER.span("run_batch"):
+            summaries = run_batch(pattern, workers=workers, interactive=args.interactive,
+                                  use_cache=not args.no_cache, plots=not args.no_plots)
+        failed = [summary for summary in summaries if summary["status"] != "ok"]
+        print(f"{len(summaries) - len(failed)} von {len(summaries)} Chats ausgewertet")
+        for summary in failed:
+            print(f"Fehler bei {summary['chat']}: {summary['error']}")
+        finish_profile(profile_path)
+        sys.exit()
+
     chatname = args.chatname
 
-    reporter = Reporter(chatname)
-    reporter.create_report()
+    try:
+        workers = 1 if args.workers is None else args.workers
+        with PROFILER.span("Reporter"):
+            reporter = Reporter(chatname, workers=workers, use_cache=not args.no_cache)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit()
+    reporter.create_report(interactive=args.interactive, plots=not args.no_plots)
+    finish_profile(profile_path)